@@ -0,0 +1,70 @@
+import asyncio
+import os
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine, make_url, pool, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from main import Base
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# modele z main.py - potrzebne do `alembic revision --autogenerate`
+target_metadata = Base.metadata
+
+DATABASE_URL = os.getenv("DATABASE_URL")
+if not DATABASE_URL:
+    raise RuntimeError("DATABASE_URL not set in environment or .env file")
+
+
+def run_migrations_offline() -> None:
+    # `alembic upgrade head --sql` - wypisuje SQL zamiast łączyć się z bazą
+    context.configure(
+        url=DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+# kontenery startują równolegle i każdy robi `alembic upgrade head` - na PostgreSQL blokada
+# na czas transakcji migracji, więc kolejny czeka i widzi już nową wersję zamiast powtarzać DDL
+MIGRATIONS_LOCK_ID = 7461
+
+
+def do_run_migrations(connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        if connection.dialect.name == "postgresql":
+            connection.execute(text("SELECT pg_advisory_xact_lock(:id)"), {"id": MIGRATIONS_LOCK_ID})
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    engine = create_async_engine(DATABASE_URL, poolclass=pool.NullPool)
+    async with engine.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await engine.dispose()
+
+
+def run_migrations_online() -> None:
+    # ten sam DATABASE_URL co aplikacja, więc obsługujemy też sterowniki async (asyncpg, aiosqlite)
+    if make_url(DATABASE_URL).get_dialect().is_async:
+        asyncio.run(run_async_migrations())
+        return
+    engine = create_engine(DATABASE_URL, poolclass=pool.NullPool)
+    with engine.connect() as connection:
+        do_run_migrations(connection)
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
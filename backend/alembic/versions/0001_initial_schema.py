@@ -0,0 +1,81 @@
+"""initial schema: todos, todo_tombstones, indexes
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # bazy sprzed migracji mają już tabele z create_all, więc zakładamy tylko to, czego brakuje
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "todos" not in tables:
+        op.create_table(
+            "todos",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("completed", sa.Boolean(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=True),
+            sa.Column("updated_at", sa.DateTime(), nullable=True),
+        )
+    if "todo_tombstones" not in tables:
+        op.create_table(
+            "todo_tombstones",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("todo_id", sa.Integer(), nullable=False),
+            sa.Column("deleted_at", sa.DateTime(), nullable=False),
+        )
+
+    completed = sa.column("completed", sa.Boolean())
+    indexes = [
+        ("ix_todos_id", "todos", ["id"], {}),
+        ("ix_todos_title", "todos", ["title"], {}),
+        ("ix_todos_created_at_id", "todos", [sa.text("created_at DESC"), sa.text("id DESC")], {}),
+        ("ix_todos_updated_at_id", "todos", ["updated_at", "id"], {}),
+        (
+            "ix_todos_active_created_at_id", "todos", [sa.text("created_at DESC"), sa.text("id DESC")],
+            {"postgresql_where": completed == sa.false(), "sqlite_where": completed == sa.false()},
+        ),
+        (
+            "ix_todos_completed_created_at_id", "todos", [sa.text("created_at DESC"), sa.text("id DESC")],
+            {"postgresql_where": completed == sa.true(), "sqlite_where": completed == sa.true()},
+        ),
+        ("ix_todo_tombstones_deleted_at_id", "todo_tombstones", ["deleted_at", "id"], {}),
+    ]
+    for name, table, columns, options in indexes:
+        existing = {index["name"] for index in inspector.get_indexes(table)} if table in tables else set()
+        if name not in existing:
+            op.create_index(name, table, columns, **options)
+
+    # indeks trigramowy pod /todos/search - tylko gdy serwer ma pg_trgm, w savepoincie,
+    # żeby brak rozszerzenia nie przerwał migracji
+    if op.get_bind().dialect.name == "postgresql":
+        connection = op.get_bind()
+        try:
+            with connection.begin_nested():
+                connection.execute(sa.text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                connection.execute(sa.text(
+                    "CREATE INDEX IF NOT EXISTS ix_todos_title_trgm ON todos USING gin (title gin_trgm_ops)"
+                ))
+        except sa.exc.DBAPIError as e:
+            print(f"pg_trgm not available, skipping ix_todos_title_trgm: {e.orig}")
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_todos_title_trgm")
+    op.drop_table("todo_tombstones")
+    op.drop_table("todos")
@@ -0,0 +1,30 @@
+"""todos.client_key for idempotent creates
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # kolumna nullable bez domyślnej wartości - na PostgreSQL bez przepisywania tabeli
+    op.add_column("todos", sa.Column("client_key", sa.String(), nullable=True))
+    op.create_index("ix_todos_client_key", "todos", ["client_key"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_client_key", table_name="todos")
+    with op.batch_alter_table("todos") as batch_op:
+        batch_op.drop_column("client_key")
@@ -0,0 +1,39 @@
+"""todos_archive for old completed todos
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # osobna tabela zamiast partycji todos - bez przepisywania tabeli i zmiany klucza głównego
+    op.create_table(
+        "todos_archive",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("title", sa.String(), nullable=False),
+        sa.Column("completed", sa.Boolean(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ix_todos_archive_created_at_id", "todos_archive", [sa.text("created_at DESC"), sa.text("id DESC")]
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todos_archive_created_at_id", table_name="todos_archive")
+    op.drop_table("todos_archive")
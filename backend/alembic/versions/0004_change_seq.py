@@ -0,0 +1,35 @@
+"""change_seq for the /todos/changes cursor
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # istniejące wiersze dostają 0 (NOT NULL z domyślną wartością - na PostgreSQL bez
+    # przepisywania tabeli); stare kursory i tak mają inny format, klienci ładują listę od nowa
+    for table in ("todos", "todo_tombstones"):
+        op.add_column(table, sa.Column("change_seq", sa.BigInteger(), server_default="0", nullable=False))
+    op.create_index("ix_todos_change_seq_id", "todos", ["change_seq", "id"])
+    op.create_index("ix_todo_tombstones_change_seq_id", "todo_tombstones", ["change_seq", "id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_tombstones_change_seq_id", table_name="todo_tombstones")
+    op.drop_index("ix_todos_change_seq_id", table_name="todos")
+    for table in ("todo_tombstones", "todos"):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column("change_seq")
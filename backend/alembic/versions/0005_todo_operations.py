@@ -0,0 +1,33 @@
+"""todo_operations - applied operation keys
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 20:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "todo_operations",
+        sa.Column("key", sa.String(length=100), primary_key=True),
+        sa.Column("todo_id", sa.Integer(), nullable=True),
+        sa.Column("applied_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_todo_operations_applied_at", "todo_operations", ["applied_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_todo_operations_applied_at", table_name="todo_operations")
+    op.drop_table("todo_operations")
@@ -0,0 +1,96 @@
+# Czas od uruchomienia procesu uvicorn do pierwszej odpowiedzi.
+#
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/cold_start.py
+# Domyślnie używa świeżego SQLite w katalogu tymczasowym, można podać inną bazę przez DATABASE_URL.
+# Mierzy osobno pierwszą odpowiedź z /health (proces wstał i słucha na porcie)
+# i pierwszą odpowiedź z GET /todos (pierwsze zapytanie do bazy). Przed pomiarem
+# uruchamia migracje, tak jak wdrożenie.
+import atexit
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+RUNS = 5
+TIMEOUT = 30
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+_bench_dir = {"path": None}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_for(url: str, deadline: float):
+    while time.perf_counter() < deadline:
+        try:
+            response = requests.get(url, timeout=1)
+            if response.status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.005)
+    raise TimeoutError(url)
+
+
+def bench_env():
+    # bez DATABASE_URL każde uruchomienie dostaje świeży plik SQLite w katalogu tymczasowym
+    # (sprzątanym na wyjściu) - stała ./bench.db zostawała ze schematem z poprzednich commitów,
+    # a create_all nie dodaje kolumn, więc po zmianie schematu benchmark się wywracał
+    env = dict(os.environ)
+    if "DATABASE_URL" not in env:
+        if _bench_dir["path"] is None:
+            _bench_dir["path"] = tempfile.mkdtemp(prefix="todo-bench-")
+            atexit.register(shutil.rmtree, _bench_dir["path"], True)
+        env["DATABASE_URL"] = f"sqlite:///{os.path.join(_bench_dir['path'], 'bench.db')}"
+    return env
+
+
+def migrate(env):
+    # schemat jak przy wdrożeniu - z migracji, nie z create_all
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, env=env, check=True)
+
+
+def measure_once():
+    port = free_port()
+    env = bench_env()
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        deadline = start + TIMEOUT
+        wait_for(f"http://127.0.0.1:{port}/health", deadline)
+        health = time.perf_counter() - start
+        wait_for(f"http://127.0.0.1:{port}/todos?limit=1", deadline)
+        first_query = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+    return health, first_query
+
+
+def main_bench():
+    migrate(bench_env())
+    results = [measure_once() for _ in range(RUNS)]
+    health = statistics.median(r[0] for r in results) * 1000
+    first_query = statistics.median(r[1] for r in results) * 1000
+    print(f"{'first response':<22} {'median ms':>10}")
+    print(f"{'GET /health':<22} {health:>10.0f}")
+    print(f"{'GET /todos':<22} {first_query:>10.0f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,254 @@
+# Test obciążeniowy backendu: mieszany ruch (lista, pojedyncze todo, dodawanie, przełączanie,
+# usuwanie, statystyki) przy kilku poziomach współbieżności i rozmiarach bazy.
+#
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/load_test.py
+# Domyślnie używa lokalnego SQLite (bench_load.db), sens ma głównie na PostgreSQL (DATABASE_URL).
+# Wymaga httpx. Ustawienia przez zmienne środowiskowe:
+#   BENCH_SIZES        rozmiary bazy (liczba todo), np. 1000,100000,1000000
+#   BENCH_CONCURRENCY  liczba równoległych klientów, np. 1,10,50
+#   BENCH_DURATION     sekundy pomiaru na każdy poziom (plus BENCH_WARMUP rozgrzewki)
+#   BENCH_MIX          wagi operacji, np. list=30,get=30,create=10,toggle=20,delete=5,stats=5
+#   BENCH_OUTPUT       plik z wynikami w JSON (domyślnie load_test.json)
+# Przed pomiarem uruchamia migracje i dosiewa/przycina tabelę todos do zadanego rozmiaru.
+# Dla każdego rozmiaru startuje osobny uvicorn; liczbę zapytań SQL na żądanie bierze
+# z licznika db_queries_total z /metrics (różnica przed i po pomiarze).
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import create_engine, delete, func, insert, make_url, select, text
+
+from cold_start import BACKEND_DIR, free_port, wait_for
+
+sys.path.insert(0, BACKEND_DIR)
+
+import main
+
+SIZES = [int(size) for size in os.getenv("BENCH_SIZES", "1000,100000").split(",")]
+CONCURRENCY = [int(level) for level in os.getenv("BENCH_CONCURRENCY", "1,10,50").split(",")]
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+WARMUP = float(os.getenv("BENCH_WARMUP", "2"))
+MIX = {
+    name: int(weight)
+    for name, weight in (
+        item.split("=") for item in os.getenv("BENCH_MIX", "list=30,get=30,create=10,toggle=20,delete=5,stats=5").split(",")
+    )
+}
+OUTPUT = os.getenv("BENCH_OUTPUT", "load_test.json")
+
+SEED_CHUNK = 10000
+ID_SAMPLE = 10000  # z ilu losowych id korzystają get/toggle/delete
+
+# operacja -> funkcja endpointu, pod którą backend liczy zapytania SQL (etykieta endpoint)
+ENDPOINTS = {
+    "list": "get_todos",
+    "get": "get_todo",
+    "create": "create_todo",
+    "toggle": "update_todo",
+    "delete": "delete_todo",
+    "stats": "get_todos_stats",
+}
+
+
+def bench_env():
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite:///./bench_load.db")
+    return env
+
+
+def sync_engine(url):
+    # seedujemy zwykłym sterownikiem także wtedy, gdy backend działa na asyncpg/aiosqlite
+    url = make_url(url)
+    return create_engine(url.set(drivername=url.get_backend_name()))
+
+
+def seed(engine, size):
+    # dosiewamy albo przycinamy tabelę do size wierszy; ~40% wykonanych, created_at rozłożone w czasie
+    todos = main.TodoDB.__table__
+    with engine.begin() as connection:
+        count = connection.scalar(select(func.count()).select_from(todos))
+        if count > size:
+            newest = select(todos.c.id).order_by(todos.c.id.desc()).limit(count - size).scalar_subquery()
+            connection.execute(delete(todos).where(todos.c.id.in_(newest)))
+        start = datetime.utcnow() - timedelta(seconds=size)
+        for offset in range(count, size, SEED_CHUNK):
+            rows = []
+            for i in range(offset, min(offset + SEED_CHUNK, size)):
+                created_at = start + timedelta(seconds=i)
+                rows.append({
+                    "title": f"load test task {i}",
+                    "completed": random.random() < 0.4,
+                    "created_at": created_at,
+                    "updated_at": created_at,
+                })
+            connection.execute(insert(todos), rows)
+        # statystyki dla planera po dużej zmianie tabeli
+        connection.execute(text("ANALYZE todos" if engine.dialect.name == "postgresql" else "ANALYZE"))
+        return list(connection.scalars(select(todos.c.id).order_by(func.random()).limit(ID_SAMPLE)))
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        value = latencies[0] * 1000 if latencies else None
+        return {"p50": value, "p95": value, "p99": value}
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {"p50": quantiles[49] * 1000, "p95": quantiles[94] * 1000, "p99": quantiles[98] * 1000}
+
+
+async def db_statements(client):
+    response = await client.get("/metrics")
+    counts = {}
+    for family in text_string_to_metric_families(response.text):
+        for sample in family.samples:
+            if sample.name == "db_queries_total":
+                counts[sample.labels["endpoint"]] = sample.value
+    return counts
+
+
+async def run_operation(client, name, ids):
+    if name == "list":
+        return await client.get("/todos?limit=50")
+    if name == "stats":
+        return await client.get("/todos/stats/summary")
+    if name == "create":
+        response = await client.post("/todos", json={"title": "load test new task"})
+        if response.status_code == 200:
+            ids.append(response.json()["id"])
+        return response
+    if name == "delete":
+        # id zdejmujemy z puli od razu, żeby dwa klienty nie usuwały tego samego
+        todo_id = ids.pop(random.randrange(len(ids)))
+        return await client.delete(f"/todos/{todo_id}")
+    todo_id = random.choice(ids)
+    if name == "get":
+        return await client.get(f"/todos/{todo_id}")
+    return await client.put(f"/todos/{todo_id}", json={"completed": random.random() < 0.5})
+
+
+async def client_loop(client, ids, deadline, samples):
+    names, weights = list(MIX), list(MIX.values())
+    while time.perf_counter() < deadline:
+        name = random.choices(names, weights)[0]
+        if name in ("get", "toggle", "delete") and not ids:
+            continue
+        start = time.perf_counter()
+        response = await run_operation(client, name, ids)
+        samples.append((name, time.perf_counter() - start, response.status_code))
+
+
+async def run_level(base_url, ids, concurrency):
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        warmup = []
+        deadline = time.perf_counter() + WARMUP
+        await asyncio.gather(*(client_loop(client, ids, deadline, warmup) for _ in range(concurrency)))
+
+        before = await db_statements(client)
+        samples = []
+        start = time.perf_counter()
+        deadline = start + DURATION
+        await asyncio.gather(*(client_loop(client, ids, deadline, samples) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        after = await db_statements(client)
+
+    operations = {}
+    for name in MIX:
+        latencies = [latency for op, latency, status in samples if op == name and status < 400]
+        requests = sum(1 for op, _, _ in samples if op == name)
+        endpoint = ENDPOINTS[name]
+        statements = after.get(endpoint, 0) - before.get(endpoint, 0)
+        operations[name] = {
+            "requests": requests,
+            "errors": requests - len(latencies),
+            "rps": requests / elapsed,
+            "latency_ms": percentiles(latencies),
+            "statements_per_request": statements / requests if requests else None,
+        }
+    ok = [latency for _, latency, status in samples if status < 400]
+    statements = sum(after.get(endpoint, 0) - before.get(endpoint, 0) for endpoint in ENDPOINTS.values())
+    return {
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": len(samples),
+        "errors": len(samples) - len(ok),
+        "rps": len(samples) / elapsed,
+        "latency_ms": percentiles(ok),
+        "statements_per_request": statements / len(samples) if samples else None,
+        "operations": operations,
+    }
+
+
+def measure_size(size):
+    env = bench_env()
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/ready", time.perf_counter() + 60)
+        # dosiewamy przed każdym poziomem, bo create/delete zmieniają rozmiar tabeli
+        results = []
+        for concurrency in CONCURRENCY:
+            engine = sync_engine(env["DATABASE_URL"])
+            try:
+                ids = seed(engine, size)
+            finally:
+                engine.dispose()
+            results.append({"size": size, **asyncio.run(run_level(base_url, ids, concurrency))})
+    finally:
+        process.terminate()
+        process.wait()
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main_bench():
+    env = bench_env()
+    subprocess.run([sys.executable, "-m", "alembic", "upgrade", "head"], cwd=BACKEND_DIR, env=env, check=True)
+
+    results = []
+    print(f"{'size':>9} {'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'stmt/req':>9} {'errors':>7}")
+    for size in SIZES:
+        for result in measure_size(size):
+            results.append(result)
+            latency = result["latency_ms"]
+            print(
+                f"{size:>9} {result['concurrency']:>5} {result['rps']:>8.0f} {latency['p50']:>8.1f} "
+                f"{latency['p95']:>8.1f} {latency['p99']:>8.1f} {result['statements_per_request']:>9.2f} "
+                f"{result['errors']:>7}"
+            )
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(),
+        "database": make_url(env["DATABASE_URL"]).get_backend_name(),
+        "duration_s": DURATION,
+        "mix": MIX,
+        "results": results,
+    }
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {OUTPUT}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,69 @@
+# Rozmiar i czas odpowiedzi GET /todos w różnych formatach, z gzip i bez.
+#
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/payload_size.py
+# Domyślnie używa świeżego SQLite w katalogu tymczasowym (schemat z migracji), można podać inną bazę przez DATABASE_URL.
+# Bajty to to, co idzie po sieci (po kompresji), czas obejmuje dekodowanie po stronie klienta.
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cold_start import bench_env, migrate
+
+os.environ["DATABASE_URL"] = bench_env()["DATABASE_URL"]
+migrate(os.environ)
+
+import msgpack
+from fastapi.testclient import TestClient
+
+import main
+
+REPEAT = 20
+PAGE_SIZES = (100, 1000)
+
+FORMATS = (
+    ("json", "application/json"),
+    ("columns json", main.COLUMNS_MEDIA_TYPE),
+    ("msgpack", main.MSGPACK_MEDIA_TYPE),
+)
+
+
+def decode(response):
+    if response.headers["content-type"].startswith(main.MSGPACK_MEDIA_TYPE):
+        return msgpack.unpackb(response.content, timestamp=3)
+    return response.json()
+
+
+def measure(client, limit, accept, encoding):
+    headers = {"Accept": accept, "Accept-Encoding": encoding}
+    wire_bytes = 0
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        response = client.get(f"/todos?limit={limit}", headers=headers)
+        response.raise_for_status()
+        decode(response)
+        wire_bytes = response.num_bytes_downloaded
+    elapsed = time.perf_counter() - start
+    return wire_bytes, elapsed / REPEAT * 1000
+
+
+def main_bench():
+    with TestClient(main.app) as client:
+        missing = max(PAGE_SIZES) - client.get("/todos/stats/summary").json()["total"]
+        for start in range(0, max(missing, 0), main.MAX_BATCH_SIZE):
+            count = min(main.MAX_BATCH_SIZE, missing - start)
+            items = [{"title": f"bench task {start + i}"} for i in range(count)]
+            client.post("/todos/batch", json={"items": items}).raise_for_status()
+
+        print(f"{'limit':>6} {'format':<14} {'gzip':<5} {'bytes':>9} {'ms/req':>8}")
+        for limit in PAGE_SIZES:
+            for name, accept in FORMATS:
+                for encoding in ("identity", "gzip"):
+                    wire_bytes, ms = measure(client, limit, accept, encoding)
+                    gzip = "yes" if encoding == "gzip" else "no"
+                    print(f"{limit:>6} {name:<14} {gzip:<5} {wire_bytes:>9} {ms:>8.2f}")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,67 @@
+# Ile zapytań SQL wysyła backend na jedno wywołanie endpointu.
+#
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/statement_count.py
+# Domyślnie używa świeżego SQLite w katalogu tymczasowym (schemat z migracji), można podać inną bazę przez DATABASE_URL.
+# Wymaga httpx (TestClient z FastAPI).
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+from cold_start import bench_env, migrate
+
+os.environ["DATABASE_URL"] = bench_env()["DATABASE_URL"]
+migrate(os.environ)
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+import main
+
+REPEAT = 50
+
+statements = []
+
+
+def count_statement(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+
+def measure(client, name, method, url_fn, json_fn=None):
+    # zwraca średnią liczbę zapytań i czas na jedno wywołanie
+    total_statements = 0
+    start = time.perf_counter()
+    for i in range(REPEAT):
+        statements.clear()
+        response = client.request(method, url_fn(i), json=json_fn(i) if json_fn else None)
+        response.raise_for_status()
+        total_statements += len(statements)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {total_statements / REPEAT:>6.1f} {elapsed / REPEAT * 1000:>10.2f}")
+
+
+def main_bench():
+    with TestClient(main.app) as client:
+        # silnik powstaje dopiero na starcie aplikacji
+        sync_engine = main.engine.sync_engine if main.ASYNC_DB else main.engine
+        event.listen(sync_engine, "before_cursor_execute", count_statement)
+        ids = []
+
+        def create_json(i):
+            return {"title": f"bench {i}"}
+
+        print(f"{'endpoint':<28} {'stmts':>6} {'ms/req':>10}")
+        for i in range(REPEAT):
+            ids.append(client.post("/todos", json=create_json(i)).json()["id"])
+        measure(client, "POST /todos", "POST", lambda i: "/todos", create_json)
+        measure(client, "GET /todos/{id}", "GET", lambda i: f"/todos/{ids[i]}")
+        measure(client, "PUT /todos/{id} (toggle)", "PUT", lambda i: f"/todos/{ids[i]}",
+                lambda i: {"completed": True})
+        measure(client, "DELETE /todos/{id}", "DELETE", lambda i: f"/todos/{ids[i]}")
+        measure(client, "GET /todos", "GET", lambda i: "/todos")
+        measure(client, "GET /todos/stats/summary", "GET", lambda i: "/todos/stats/summary")
+
+
+if __name__ == "__main__":
+    main_bench()
@@ -0,0 +1,82 @@
+# Przepustowość PUT /todos/{id} bez i z grupowym commitem (WRITE_COALESCING).
+#
+# Uruchomienie (z katalogu backend):
+#   python benchmarks/write_throughput.py
+# Domyślnie używa świeżego SQLite w katalogu tymczasowym, ale sens ma głównie na PostgreSQL (DATABASE_URL),
+# gdzie każdy commit to fsync. Wymaga httpx. CONCURRENCY klientów przez DURATION sekund
+# przełącza checkboxy losowych zadań; dla każdego trybu startuje osobny uvicorn.
+import asyncio
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from cold_start import BACKEND_DIR, bench_env, free_port, migrate, wait_for
+
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "50"))
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+TODOS = 1000
+
+
+async def client_loop(client, ids, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        todo_id = random.choice(ids)
+        start = time.perf_counter()
+        response = await client.put(f"/todos/{todo_id}", json={"completed": random.random() < 0.5})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - start)
+        else:
+            errors.append(response.status_code)
+
+
+async def run_load(base_url):
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as client:
+        page = (await client.get(f"/todos?limit={TODOS}")).json()
+        ids = [todo["id"] for todo in page["items"]]
+        if len(ids) < TODOS:
+            items = [{"title": f"bench task {i}"} for i in range(TODOS - len(ids))]
+            created = (await client.post("/todos/batch", json={"items": items})).json()
+            ids += [todo["id"] for todo in created]
+
+        latencies, errors = [], []
+        deadline = time.perf_counter() + DURATION
+        await asyncio.gather(*(client_loop(client, ids, deadline, latencies, errors) for _ in range(CONCURRENCY)))
+        return latencies, errors
+
+
+def measure(coalescing: bool):
+    port = free_port()
+    env = bench_env()
+    env["WRITE_COALESCING"] = "true" if coalescing else "false"
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=env,
+    )
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        wait_for(f"{base_url}/health", time.perf_counter() + 30)
+        latencies, errors = asyncio.run(run_load(base_url))
+    finally:
+        process.terminate()
+        process.wait()
+    quantiles = statistics.quantiles(latencies, n=100)
+    return len(latencies) / DURATION, quantiles[49] * 1000, quantiles[98] * 1000, len(errors)
+
+
+def main_bench():
+    migrate(bench_env())
+    print(f"concurrency={CONCURRENCY} duration={DURATION}s")
+    print(f"{'mode':<14} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for coalescing in (False, True):
+        rps, p50, p99, errors = measure(coalescing)
+        mode = "group commit" if coalescing else "per request"
+        print(f"{mode:<14} {rps:>8.0f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+
+
+if __name__ == "__main__":
+    main_bench()
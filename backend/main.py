@@ -1,26 +1,250 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool, iterate_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime
+from fastapi.responses import StreamingResponse
+from starlette.middleware.gzip import GZipMiddleware
+from sqlalchemy import create_engine, make_url, Column, Integer, BigInteger, String, Boolean, DateTime, Index, tuple_
+from sqlalchemy import select, insert, update, delete, func, text, event, case, literal
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
-from pydantic import BaseModel
-from datetime import datetime
-from typing import List, Optional
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from sqlalchemy.sql.expression import ColumnElement
+from sqlalchemy.sql.visitors import InternalTraversal
+from prometheus_client import Counter, Gauge, Histogram
+from prometheus_fastapi_instrumentator import Instrumentator
+from pydantic import BaseModel, Field
+from datetime import datetime, timedelta, timezone
+from typing import List, Literal, Optional
+from collections import OrderedDict
+from contextlib import asynccontextmanager
 import os
+import json
+import time
+import uuid
+import base64
+import select as io_select
+import asyncio
+import threading
+import contextvars
 from dotenv import load_dotenv
 
+# orjson jest kilka razy szybszy od json przy dużych listach, ale nie jest wymagany
+try:
+    import orjson
 
+    def json_dumps(value) -> bytes:
+        return orjson.dumps(value)
+except ImportError:
+    def json_dumps(value) -> bytes:
+        return json.dumps(value, default=lambda v: v.isoformat()).encode()
+
+# MessagePack dla klientów, którzy o niego poproszą (Accept: application/msgpack); bez pakietu
+# zostaje JSON i kolumnowy JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+# Adres bazy czytamy przy imporcie, ale silnik powstaje dopiero na starcie aplikacji (lifespan),
+# więc import main nie łączy się z bazą i uvicorn od razu otwiera port.
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
-if not SQLALCHEMY_DATABASE_URL:
-    raise RuntimeError("DATABASE_URL not set in environment or .env file")
 
-# Tworzymy silnik bazy PostgreSQL
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Opcjonalna replika do odczytów (GET /todos, GET /todos/{id}, statystyki, strumień).
+# Musi używać tego samego trybu (sync/async) co DATABASE_URL.
+SQLALCHEMY_READ_DATABASE_URL = os.getenv("DATABASE_READ_URL")
+
+# Schematem zarządza Alembic (alembic upgrade head przed wdrożeniem). Do testów i benchmarków
+# na świeżej bazie można zamiast tego utworzyć tabele na starcie aplikacji.
+DB_CREATE_SCHEMA = os.getenv("DB_CREATE_SCHEMA", "false").lower() in ("1", "true", "yes")
+
+# Tryb async wybieramy po sterowniku z DATABASE_URL, np. postgresql+asyncpg://
+# albo sqlite+aiosqlite://. Zwykły postgresql:// (psycopg2) albo sqlite:// to tryb sync,
+# przydatny do testów na lokalnej bazie. Ustawiane w init_db().
+ASYNC_DB = False
+# na PostgreSQL zdarzenia o zmianach idą przez LISTEN/NOTIFY, więc widzą je wszystkie workery
+PG_NOTIFY = False
+
+# Ustawienia puli połączeń. pre_ping sprawdza połączenie przed użyciem, więc po restarcie
+# bazy martwe połączenia są wymieniane zamiast kończyć się 500, a recycle zamyka stare.
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# przez tyle sekund po zapisie odczyty idą do primary, żeby opóźniona replika
+# nie oddała starych danych pod nowym ETagiem
+READ_AFTER_WRITE_PRIMARY_SECONDS = float(os.getenv("READ_AFTER_WRITE_PRIMARY_SECONDS", "2"))
+
+# Metryki bazy dla /metrics - zapytania liczone per endpoint (nazwa funkcji endpointu)
+DB_QUERIES = Counter("db_queries_total", "SQL statements executed", ["endpoint"])
+DB_QUERY_DURATION = Histogram("db_query_duration_seconds", "SQL statement execution time", ["endpoint"])
+DB_QUERY_ERRORS = Counter("db_query_errors_total", "SQL statements that failed", ["endpoint"])
+DB_POOL_WAIT = Histogram("db_pool_wait_seconds", "Time spent waiting for a pooled connection")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool", ["engine"])
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Connections opened above pool_size", ["engine"])
+
+# endpoint obsługujący bieżące zapytanie HTTP, ustawiany przez zależność track_endpoint
+current_endpoint = contextvars.ContextVar("current_endpoint", default="none")
+
+
+class TimedPoolMixin:
+    # mierzy ile czekamy na wolne połączenie z puli
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            DB_POOL_WAIT.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+
+class TimedAsyncQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    endpoint = current_endpoint.get()
+    DB_QUERIES.labels(endpoint).inc()
+    DB_QUERY_DURATION.labels(endpoint).observe(elapsed)
+
+
+def fail_query_timer(context):
+    # after_cursor_execute nie przychodzi dla zapytania, które rzuciło wyjątkiem - zdejmujemy
+    # jego start tutaj (inaczej zostaje w conn.info na zawsze) i liczymy je jako nieudane.
+    # Błędy bez zapytania (np. przy łączeniu, commit) nie mają startu do zdjęcia.
+    conn = context.connection
+    if context.statement is None or conn is None or not conn.info.get("query_start"):
+        return
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    endpoint = current_endpoint.get()
+    DB_QUERIES.labels(endpoint).inc()
+    DB_QUERY_ERRORS.labels(endpoint).inc()
+    DB_QUERY_DURATION.labels(endpoint).observe(elapsed)
+
+
+def make_engine(url: str, name: str):
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    # SQLite ma własne domyślne pule (np. dla :memory:), więc rozmiar puli ustawiamy tylko na PostgreSQL
+    if make_url(url).get_backend_name() == "postgresql":
+        options.update(
+            poolclass=TimedAsyncQueuePool if ASYNC_DB else TimedQueuePool,
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    new_engine = create_async_engine(url, **options) if ASYNC_DB else create_engine(url, **options)
+
+    # eventy SQLAlchemy są podpięte pod silnik synchroniczny, także w trybie async
+    sync_engine = new_engine.sync_engine if ASYNC_DB else new_engine
+    event.listen(sync_engine, "before_cursor_execute", start_query_timer)
+    event.listen(sync_engine, "after_cursor_execute", stop_query_timer)
+    event.listen(sync_engine, "handle_error", fail_query_timer)
+    # stan puli odczytujemy dopiero przy scrapowaniu /metrics (nie każda pula ma te metody)
+    pool = sync_engine.pool
+    DB_POOL_CHECKED_OUT.labels(name).set_function(lambda: getattr(pool, "checkedout", lambda: 0)())
+    DB_POOL_OVERFLOW.labels(name).set_function(lambda: max(getattr(pool, "overflow", lambda: 0)(), 0))
+    return new_engine
+
+
+def make_sessionmaker(bind):
+    # expire_on_commit=False - po commicie obiekty muszą dać się zserializować bez dociągania z bazy
+    if ASYNC_DB:
+        return async_sessionmaker(bind, autoflush=False, expire_on_commit=False)
+    return sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=bind)
+
+
+# Silniki i sesje tworzy init_db() na starcie aplikacji
+engine = None
+SessionLocal = None
+read_engine = None
+ReadSessionLocal = None
+
+
+def init_db():
+    global ASYNC_DB, PG_NOTIFY, engine, SessionLocal, read_engine, ReadSessionLocal
+    if engine is not None:
+        return
+    if not SQLALCHEMY_DATABASE_URL:
+        raise RuntimeError("DATABASE_URL not set in environment or .env file")
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    ASYNC_DB = url.get_dialect().is_async
+    PG_NOTIFY = url.get_backend_name() == "postgresql"
+    if SQLALCHEMY_READ_DATABASE_URL and make_url(SQLALCHEMY_READ_DATABASE_URL).get_dialect().is_async != ASYNC_DB:
+        raise RuntimeError("DATABASE_READ_URL must use the same sync/async driver as DATABASE_URL")
+
+    # create_engine nie otwiera połączenia - pierwsze powstaje przy pierwszym zapytaniu
+    engine = make_engine(SQLALCHEMY_DATABASE_URL, "primary")
+    SessionLocal = make_sessionmaker(engine)
+    if SQLALCHEMY_READ_DATABASE_URL:
+        read_engine = make_engine(SQLALCHEMY_READ_DATABASE_URL, "replica")
+        ReadSessionLocal = make_sessionmaker(read_engine)
+    else:
+        read_engine = engine
+        ReadSessionLocal = SessionLocal
+
+
+async def warm_up_pool():
+    # pierwsze połączenie (TCP, TLS, logowanie) otwieramy w tle, już po otwarciu portu,
+    # żeby nie płacił za nie pierwszy użytkownik; błąd nie blokuje startu - pokaże go /ready
+    try:
+        if ASYNC_DB:
+            async with engine.connect():
+                pass
+        else:
+            await run_in_threadpool(lambda: engine.connect().close())
+    except Exception as e:
+        print(f"database warm-up failed: {e}")
+
+
+async def dispose_db():
+    for db_engine in {engine, read_engine}:
+        if ASYNC_DB:
+            await db_engine.dispose()
+        else:
+            await run_in_threadpool(db_engine.dispose)
+
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
+# Numer zmiany dla /todos/changes, nadawany przez bazę w samym zapisie. updated_at się do tego
+# nie nadaje - to czas z Pythona sprzed commitu, więc transakcja ze starszym czasem może się
+# zatwierdzić po nowszej, a czytelnik przesunie już kursor za nią i zmiana przepadnie.
+# SQLite: max + 1 w tym samym zapytaniu - zapisy i tak idą po kolei (blokada bazy do commitu),
+# więc numery rosną w kolejności commitów. PostgreSQL: id transakcji (txid_current()), bez
+# blokady; kolejność commitów zapewnia czytelnik, który bierze tylko numery poniżej xmin
+# swojego snapshotu (changes_horizon) - wszystkie takie transakcje są już zakończone.
+class next_change_seq(ColumnElement):
+    inherit_cache = True
+    _traverse_internals = [("table", InternalTraversal.dp_string)]
+    type = BigInteger()
+
+    def __init__(self, table: str):
+        self.table = table
+
+
+@compiles(next_change_seq)
+def compile_next_change_seq(element, compiler, **kw):
+    return f"(SELECT coalesce(max(change_seq), 0) + 1 FROM {element.table})"
+
+
+@compiles(next_change_seq, "postgresql")
+def compile_next_change_seq_pg(element, compiler, **kw):
+    return "txid_current()"
+
+
 # Model bazy danych
 class TodoDB(Base):
     __tablename__ = "todos"
@@ -30,10 +254,190 @@ class TodoDB(Base):
     completed = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(
+        BigInteger, nullable=False, server_default="0",
+        default=next_change_seq("todos"), onupdate=next_change_seq("todos"),
+    )
+    # klucz idempotencji od klienta (Idempotency-Key, operacje offline) - ponowiony POST
+    # z tym samym kluczem zwraca istniejące zadanie zamiast tworzyć drugie
+    client_key = Column(String, nullable=True)
+
+    # indeks pod stronicowanie po (created_at, id) - bez niego każda strona sortuje całą tabelę
+    __table_args__ = (
+        Index("ix_todos_created_at_id", created_at.desc(), id.desc()),
+        # indeks pod GET /todos/changes - zmiany od kursora (change_seq, id)
+        Index("ix_todos_change_seq_id", change_seq, id),
+        # kandydaci do archiwizacji (najstarsze updated_at)
+        Index("ix_todos_updated_at_id", updated_at, id),
+        # częściowe indeksy pod GET /todos?completed=... - każda zakładka ma swój, mniejszy indeks
+        Index(
+            "ix_todos_active_created_at_id", created_at.desc(), id.desc(),
+            postgresql_where=completed == False, sqlite_where=completed == False,
+        ),
+        Index(
+            "ix_todos_completed_created_at_id", created_at.desc(), id.desc(),
+            postgresql_where=completed == True, sqlite_where=completed == True,
+        ),
+        Index("ix_todos_client_key", client_key, unique=True),
+    )
+
+
+# Ślady po usuniętych todo, żeby /todos/changes mógł zwrócić też usunięcia
+class TombstoneDB(Base):
+    __tablename__ = "todo_tombstones"
+
+    id = Column(Integer, primary_key=True)
+    todo_id = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    change_seq = Column(BigInteger, nullable=False, server_default="0", default=next_change_seq("todo_tombstones"))
+
+    __table_args__ = (
+        Index("ix_todo_tombstones_change_seq_id", change_seq, id),
+        # pod sprzątanie starych tombstone'ów
+        Index("ix_todo_tombstones_deleted_at_id", deleted_at, id),
+    )
+
+
+# Klucze operacji z POST /todos/operations, które już weszły do bazy. Ponowiona paczka
+# (zgubiona odpowiedź, replay po restarcie klienta) pomija je, więc stary update nie nadpisze
+# zmian zrobionych w międzyczasie. Sprzątane razem z tombstone'ami, po tej samej retencji.
+class AppliedOperationDB(Base):
+    __tablename__ = "todo_operations"
+
+    key = Column(String(100), primary_key=True)
+    todo_id = Column(Integer, nullable=True)
+    applied_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_todo_operations_applied_at", applied_at),
+    )
+
+
+# Archiwum: wykonane todo, których nikt nie ruszał od ARCHIVE_AFTER_DAYS, przenosimy tutaj
+# (to samo id), żeby tabela todos - sortowanie listy, COUNT-y statystyk, indeksy - zawierała
+# tylko to, z czym się pracuje. Przeglądanie przez GET /todos/archive.
+class ArchivedTodoDB(Base):
+    __tablename__ = "todos_archive"
+
+    id = Column(Integer, primary_key=True)
+    title = Column(String, nullable=False)
+    completed = Column(Boolean, nullable=False)
+    created_at = Column(DateTime)
+    updated_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index("ix_todos_archive_created_at_id", created_at.desc(), id.desc()),
+    )
+
+
+# Indeks trigramowy pod /todos/search. Tylko PostgreSQL z rozszerzeniem pg_trgm, więc nie
+# siedzi w __table_args__ (na SQLite byłby zwykłym duplikatem ix_todos_title). Bez niego
+# wyszukiwanie działa tak samo, tylko skanuje tabelę. None - jeszcze nie sprawdzaliśmy, czy
+# migracja go założyła (sprawdzamy przy pierwszym wyszukiwaniu, nie na starcie).
+_search = {"trigram": None}
+
+
+def has_search_index(db: Session) -> bool:
+    if db.get_bind().dialect.name != "postgresql":
+        return False
+    return db.execute(text("SELECT to_regclass('ix_todos_title_trgm') IS NOT NULL")).scalar()
+
+
+def create_search_index(connection):
+    if connection.dialect.name != "postgresql":
+        return
+    try:
+        # savepoint - nieudany CREATE EXTENSION nie może zepsuć reszty transakcji
+        with connection.begin_nested():
+            connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            connection.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_todos_title_trgm ON todos USING gin (title gin_trgm_ops)"
+            ))
+        _search["trigram"] = True
+    except Exception as e:
+        print(f"pg_trgm not available, /todos/search will scan the table: {e}")
 
 
 # Tworzymy tabele w bazie jeśli ich nie ma
-Base.metadata.create_all(bind=engine)
+def create_schema(connection):
+    Base.metadata.create_all(bind=connection)
+    # create_all nie dokłada indeksów do istniejących tabel, więc robimy to osobno
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=connection, checkfirst=True)
+    create_search_index(connection)
+
+
+async def create_schema_on_startup():
+    if ASYNC_DB:
+        async with engine.begin() as connection:
+            await connection.run_sync(create_schema)
+    else:
+        def create_sync_schema():
+            with engine.begin() as connection:
+                create_schema(connection)
+        await run_in_threadpool(create_sync_schema)
+
+# domyślny i maksymalny rozmiar strony w GET /todos
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# domyślna liczba zmian w jednej odpowiedzi GET /todos/changes (osobno zmiany i usunięcia)
+DEFAULT_CHANGES_PAGE_SIZE = 500
+# tombstone'y starsze niż TOMBSTONE_RETENTION_DAYS kasujemy co TOMBSTONE_PRUNE_INTERVAL sekund
+# (0 = wyłączone) paczkami po TOMBSTONE_PRUNE_BATCH_SIZE; kursor /todos/changes starszy niż
+# retencja dostaje 410 i klient ładuje listę od nowa, bo usunięcia sprzed retencji już zniknęły
+TOMBSTONE_RETENTION_DAYS = float(os.getenv("TOMBSTONE_RETENTION_DAYS", "7"))
+TOMBSTONE_PRUNE_INTERVAL = float(os.getenv("TOMBSTONE_PRUNE_INTERVAL", "3600"))
+TOMBSTONE_PRUNE_BATCH_SIZE = int(os.getenv("TOMBSTONE_PRUNE_BATCH_SIZE", "1000"))
+# domyślna i maksymalna liczba wyników GET /todos/search
+DEFAULT_SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+# ile wierszy naraz czytamy z kursora serwerowego w GET /todos/stream
+STREAM_CHUNK_SIZE = 1000
+# maksymalna liczba elementów w jednym zapytaniu /todos/batch
+MAX_BATCH_SIZE = 1000
+# co ile sekund strumień /todos/events wysyła heartbeat
+EVENTS_HEARTBEAT_INTERVAL = float(os.getenv("EVENTS_HEARTBEAT_INTERVAL", "10"))
+# kanał NOTIFY i limit payloadu (PostgreSQL ucina na 8000 bajtach)
+EVENTS_CHANNEL = "todo_events"
+MAX_NOTIFY_PAYLOAD = 7900
+# ile zdarzeń może czekać na jednego subskrybenta zanim każemy mu się zsynchronizować
+EVENTS_QUEUE_SIZE = 1000
+# ile sekund trzymamy wynik /todos/stats/summary (zapisy i tak go unieważniają)
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "5"))
+# cache pojedynczych todo dla GET /todos/{id}: rozmiar (LRU), TTL w sekundach
+# i opcjonalny redis:// współdzielony przez workery zamiast pamięci procesu
+TODO_CACHE_SIZE = int(os.getenv("TODO_CACHE_SIZE", "10000"))
+TODO_CACHE_TTL = float(os.getenv("TODO_CACHE_TTL", "60"))
+TODO_CACHE_URL = os.getenv("TODO_CACHE_URL")
+# w Redisie wpis z odczytu (nie z zapisu) żyje krócej - patrz RedisTodoCache.fill
+TODO_CACHE_FILL_TTL = float(os.getenv("TODO_CACHE_FILL_TTL", "5"))
+# odpowiedzi mniejsze niż próg idą bez gzip (nagłówki i CPU kosztują więcej niż zysk);
+# poziom 6 to rozsądny kompromis - 9 jest kilka razy wolniejszy przy prawie tym samym rozmiarze
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+COMPRESSION_LEVEL = int(os.getenv("COMPRESSION_LEVEL", "6"))
+# Grupowy commit dla PUT /todos/{id} (opt-in): zapisy z równoległych żądań zbieramy przez
+# WRITE_BATCH_DELAY_MS i zapisujemy w jednej transakcji. Każde żądanie czeka na swoją paczkę,
+# więc odpowiedź dalej przychodzi dopiero po commicie - kosztem kilku ms opóźnienia.
+WRITE_COALESCING = os.getenv("WRITE_COALESCING", "false").lower() in ("1", "true", "yes")
+WRITE_BATCH_DELAY = float(os.getenv("WRITE_BATCH_DELAY_MS", "5")) / 1000
+WRITE_BATCH_MAX_SIZE = int(os.getenv("WRITE_BATCH_MAX_SIZE", "200"))
+# ile paczek może się zapisywać naraz (każda zajmuje połączenie z puli)
+WRITE_BATCH_CONCURRENCY = int(os.getenv("WRITE_BATCH_CONCURRENCY", "4"))
+# Archiwizacja wykonanych todo: starsze (wg updated_at) niż ARCHIVE_AFTER_DAYS przenosimy
+# paczkami po ARCHIVE_BATCH_SIZE (każda paczka to osobna, krótka transakcja), najwyżej
+# ARCHIVE_MAX_BATCHES paczek na jedno przejście. Domyślnie wyłączone (ARCHIVE_INTERVAL=0) -
+# zarchiwizowane zadania znikają z listy we frontendzie, który nie ma widoku archiwum; włącza
+# się zadaniem w tle co ARCHIVE_INTERVAL sekund albo cronem wołającym POST /todos/archive.
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "500"))
+ARCHIVE_MAX_BATCHES = int(os.getenv("ARCHIVE_MAX_BATCHES", "100"))
+ARCHIVE_INTERVAL = float(os.getenv("ARCHIVE_INTERVAL", "0"))
+# zwarte formaty list dla GET /todos i /todos/changes: pola jako tablice (każda nazwa pola raz,
+# a nie w każdym wierszu), jako JSON albo MessagePack z datami jako znacznik czasu
+COLUMNS_MEDIA_TYPE = "application/vnd.todos.columns+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
 
 
 # Modele Pydantic
@@ -52,13 +456,164 @@ class TodoResponse(BaseModel):
     completed: bool
     created_at: datetime
     updated_at: datetime
+    # klucz z Idempotency-Key / operacji create - po nim klient łączy zadanie utworzone
+    # offline (jeszcze bez id) z tym samym zadaniem, które przyszło w zdarzeniu
+    client_key: Optional[str] = None
     
     class Config:
         from_attributes = True
 
 
+class TodoBatchUpdateItem(TodoUpdate):
+    id: int
+
+
+class TodoBatchCreate(BaseModel):
+    items: List[TodoCreate] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class TodoBatchUpdate(BaseModel):
+    items: List[TodoBatchUpdateItem] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class TodoBatchDelete(BaseModel):
+    ids: List[int] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class TodoOperation(BaseModel):
+    # jedna operacja z dziennika klienta; key to klucz idempotencji operacji, a ref - klucz
+    # operacji create, gdy zadanie powstało offline i klient nie zna jeszcze jego id.
+    # clear_completed usuwa wszystkie wykonane (jak DELETE /todos?completed=true), ale po kolei
+    # z resztą dziennika - po zmianach zrobionych przed nim, także offline
+    key: str = Field(..., min_length=1, max_length=100)
+    op: Literal["create", "update", "delete", "clear_completed"]
+    id: Optional[int] = None
+    ref: Optional[str] = None
+    title: Optional[str] = None
+    completed: Optional[bool] = None
+
+
+class TodoOperationBatch(BaseModel):
+    items: List[TodoOperation] = Field(..., max_length=MAX_BATCH_SIZE)
+
+
+class TodoOperationResult(BaseModel):
+    key: str
+    status: Literal["ok", "missing"]  # missing = zadania już nie ma (usunięte gdzie indziej)
+    todo: Optional[TodoResponse] = None  # stan zadania po całej paczce (create/update), z id z backendu
+
+
+class TodoPage(BaseModel):
+    items: List[TodoResponse]
+    next_cursor: Optional[str] = None  # None = nie ma kolejnej strony
+
+
+class ArchivedTodoResponse(TodoResponse):
+    archived_at: datetime
+
+
+class ArchivedTodoPage(BaseModel):
+    items: List[ArchivedTodoResponse]
+    next_cursor: Optional[str] = None
+
+
+class ArchiveRun(BaseModel):
+    archived: int  # ile todo przeniesiono do archiwum
+    has_more: bool  # przejście skończyło się na limicie paczek, zostały jeszcze kandydaci
+
+
+class TodoChanges(BaseModel):
+    changed: List[TodoResponse]  # nowe albo zmienione od kursora
+    deleted: List[int]  # id usuniętych od kursora
+    cursor: str  # kursor do następnego zapytania
+    has_more: bool  # czy od razu pytać dalej
+
+
+# Kursory kodujemy w base64, klient traktuje je jako nieprzezroczyste stringi.
+# Padding obcinamy, żeby kursor nie wymagał escapowania w URL.
+def _b64encode(raw: str) -> str:
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _b64decode(cursor: str) -> str:
+    return base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+
+
+# Kursor stronicowania to (created_at, id) ostatniego elementu strony
+def encode_cursor(todo: TodoDB) -> str:
+    return _b64encode(f"{todo.created_at.isoformat()}|{todo.id}")
+
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, todo_id = _b64decode(cursor).split("|")
+        return datetime.fromisoformat(created_at), int(todo_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+# Kursor zmian trzyma dwie pozycje: (change_seq, id) w todos i w tombstones, plus czas
+# wydania kursora (do sprawdzenia, czy nie jest starszy niż retencja tombstone'ów).
+# None = tabela była pusta, czyli bierzemy wszystko od początku.
+def encode_changes_cursor(todos_pos, tombstones_pos) -> str:
+    parts = []
+    for pos in (todos_pos, tombstones_pos):
+        parts += [str(pos[0]), str(pos[1])] if pos else ["", ""]
+    parts.append(datetime.utcnow().isoformat())
+    return _b64encode("|".join(parts))
+
+
+def decode_changes_cursor(cursor: str):
+    try:
+        todos_seq, todos_id, tombstones_seq, tombstones_id, issued_at = _b64decode(cursor).split("|")
+        todos_pos = (int(todos_seq), int(todos_id)) if todos_seq else None
+        tombstones_pos = (int(tombstones_seq), int(tombstones_id)) if tombstones_seq else None
+        issued_at = datetime.fromisoformat(issued_at)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if issued_at < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        raise HTTPException(status_code=410, detail="Cursor expired")
+    return todos_pos, tombstones_pos
+
+
+async def track_endpoint(request: Request):
+    # zależność async, żeby ustawiony contextvar był widoczny w endpoincie i w threadpoolu
+    endpoint = request.scope.get("endpoint")
+    current_endpoint.set(endpoint.__name__ if endpoint else "none")
+
+
+# Start aplikacji nie wysyła nic do bazy: silnik łączy się przy pierwszym zapytaniu, schemat
+# zakłada Alembic, a gotowość bazy sprawdza /ready.
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_db()
+    if DB_CREATE_SCHEMA:
+        await create_schema_on_startup()
+    warm_up = asyncio.create_task(warm_up_pool())
+    listener = start_events_listener()
+    if update_coalescer:
+        update_coalescer.start()
+    periodic = [
+        start_periodic(ARCHIVE_INTERVAL, archive_job, "archive_todos"),
+        start_periodic(TOMBSTONE_PRUNE_INTERVAL, prune_job, "prune_tombstones"),
+    ]
+    yield
+    for task in periodic:
+        if task:
+            task.cancel()
+    if update_coalescer:
+        update_coalescer.stop()
+    warm_up.cancel()
+    if listener:
+        listener.cancel()
+    await dispose_db()
+
+
 # Tworzymy aplikację FastAPI
-app = FastAPI()
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(track_endpoint)])
+
+# /metrics z histogramami czasu odpowiedzi per endpoint; strumień SSE pomijamy, bo trwa godzinami
+Instrumentator(excluded_handlers=["/metrics", "/todos/events"]).instrument(app).expose(app)
 
 # Konfiguracja CORS
 app.add_middleware(
@@ -70,89 +625,1309 @@ app.add_middleware(
 )
 
 
-# Dependency do sesji DB
-def get_db():
+# gzip dla odpowiedzi powyżej progu, o ile klient wysłał Accept-Encoding: gzip
+class CompressionMiddleware(GZipMiddleware):
+    # SSE nie może przechodzić przez bufor gzip - heartbeat i zdarzenia utknęłyby w kompresorze
+    excluded_paths = {"/todos/events"}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"] in self.excluded_paths:
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+app.add_middleware(CompressionMiddleware, minimum_size=COMPRESSION_MIN_SIZE, compresslevel=COMPRESSION_LEVEL)
+
+
+def start_events_listener():
+    # zwraca zadanie asyncio do anulowania przy zamykaniu; wątek psycopg2 jest daemonem
+    if not PG_NOTIFY:
+        return None
+    if ASYNC_DB:
+        return asyncio.create_task(pg_listen_async())
+    loop = asyncio.get_running_loop()
+    threading.Thread(target=pg_listen_sync, args=(loop,), daemon=True).start()
+    return None
+
+
+def read_sessionmaker():
+    # odczyty idą do repliki, chyba że niedawno był zapis
+    if time.monotonic() - _collection["last_write"] < READ_AFTER_WRITE_PRIMARY_SECONDS:
+        return SessionLocal
+    return ReadSessionLocal
+
+
+# Dependency do sesji DB. Tryb sync/async znamy dopiero po init_db(), więc obie zależności
+# są async i zamykają sesję sync w threadpoolu (close oddaje połączenie do puli).
+async def close_db(db):
+    if ASYNC_DB:
+        await db.close()
+    else:
+        await run_in_threadpool(db.close)
+
+
+async def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
+        await close_db(db)
+
+
+async def get_read_db():
+    db = read_sessionmaker()()
+    try:
+        yield db
+    finally:
+        await close_db(db)
+
+
+# Zapytania piszemy raz, jako zwykłe funkcje na synchronicznej sesji. W trybie async
+# idą przez AsyncSession.run_sync (sterownik async, pętla nie jest blokowana),
+# w trybie sync lecą w threadpoolu, więc też nie blokują pętli zdarzeń.
+async def run_db(db, fn, *args):
+    if ASYNC_DB:
+        return await db.run_sync(fn, *args)
+    return await run_in_threadpool(fn, db, *args)
+
+
+def list_todos(db: Session, limit: int, after: Optional[str], completed: Optional[bool] = None):
+    query = db.query(TodoDB).order_by(TodoDB.created_at.desc(), TodoDB.id.desc())
+    if completed is not None:
+        query = query.filter(TodoDB.completed == completed)
+    if after:
+        # keyset: bierzemy tylko wiersze "za" kursorem, bez OFFSET
+        created_at, todo_id = decode_cursor(after)
+        query = query.filter(tuple_(TodoDB.created_at, TodoDB.id) < tuple_(created_at, todo_id))
+
+    # pobieramy jeden wiersz więcej żeby wiedzieć czy jest następna strona
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+
+def list_archived_todos(db: Session, limit: int, after: Optional[str]):
+    # archiwum stronicujemy tak samo jak GET /todos - keyset po (created_at, id)
+    query = db.query(ArchivedTodoDB).order_by(ArchivedTodoDB.created_at.desc(), ArchivedTodoDB.id.desc())
+    if after:
+        created_at, todo_id = decode_cursor(after)
+        query = query.filter(tuple_(ArchivedTodoDB.created_at, ArchivedTodoDB.id) < tuple_(created_at, todo_id))
+    rows = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return {"items": rows[:limit], "next_cursor": next_cursor}
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def find_todos(db: Session, q: str, limit: int):
+    # podciąg w tytule, bez względu na wielkość liter; najpierw te które zaczynają się od q,
+    # potem (z pg_trgm) najbardziej podobne, na końcu najnowsze
+    query = db.query(TodoDB).filter(TodoDB.title.ilike(f"%{escape_like(q)}%", escape="\\"))
+    order = [case((TodoDB.title.ilike(f"{escape_like(q)}%", escape="\\"), 0), else_=1)]
+    if _search["trigram"] is None:
+        _search["trigram"] = has_search_index(db)
+    if _search["trigram"]:
+        order.append(func.similarity(TodoDB.title, q).desc())
+    order += [TodoDB.created_at.desc(), TodoDB.id.desc()]
+    return query.order_by(*order).limit(limit).all()
+
+
+# Strumieniowanie całej listy: kolumny zamiast obiektów ORM, kursor serwerowy
+# (yield_per) i od razu bajty JSON - w pamięci jest tylko jedna paczka wierszy.
+STREAM_COLUMNS = (TodoDB.id, TodoDB.title, TodoDB.completed, TodoDB.created_at, TodoDB.updated_at, TodoDB.client_key)
+
+
+def stream_query():
+    return (
+        select(*STREAM_COLUMNS)
+        .order_by(TodoDB.created_at.desc(), TodoDB.id.desc())
+        .execution_options(yield_per=STREAM_CHUNK_SIZE)
+    )
+
+
+def stream_partitions_sync():
+    with read_sessionmaker()() as db:
+        for partition in db.execute(stream_query()).partitions():
+            yield partition
+
+
+async def stream_partitions_async():
+    async with read_sessionmaker()() as db:
+        result = await db.stream(stream_query())
+        async for partition in result.partitions():
+            yield partition
+
+
+async def stream_todos(ndjson: bool):
+    if ASYNC_DB:
+        partitions = stream_partitions_async()
+    else:
+        # synchroniczny kursor czytamy w threadpoolu, paczka po paczce
+        partitions = iterate_in_threadpool(stream_partitions_sync())
+
+    separator = b"\n" if ndjson else b","
+    first = True
+    if not ndjson:
+        yield b"["
+    async for partition in partitions:
+        chunk = separator.join(json_dumps(row._asdict()) for row in partition)
+        if ndjson:
+            yield chunk + b"\n"
+        else:
+            yield chunk if first else b"," + chunk
+        first = False
+    if not ndjson:
+        yield b"]"
+
+
+def changes_horizon(db: Session, query, model):
+    # na PostgreSQL tylko numery (id transakcji) poniżej xmin snapshotu - transakcja, która
+    # jeszcze trwa, nie może się potem pojawić przed kursorem; na SQLite nic nie trzeba
+    if db.get_bind().dialect.name != "postgresql":
+        return query
+    return query.filter(model.change_seq < func.txid_snapshot_xmin(func.txid_current_snapshot()))
+
+
+def changes_head(db: Session) -> str:
+    # kursor "teraz" - ostatnia pozycja w obu tabelach, z indeksów
+    last_todo = changes_horizon(db, db.query(TodoDB.change_seq, TodoDB.id), TodoDB).order_by(
+        TodoDB.change_seq.desc(), TodoDB.id.desc()
+    ).first()
+    last_tombstone = changes_horizon(db, db.query(TombstoneDB.change_seq, TombstoneDB.id), TombstoneDB).order_by(
+        TombstoneDB.change_seq.desc(), TombstoneDB.id.desc()
+    ).first()
+    return encode_changes_cursor(last_todo, last_tombstone)
+
+
+def list_changes(db: Session, since: str, limit: int):
+    todos_pos, tombstones_pos = decode_changes_cursor(since)
+
+    query = changes_horizon(db, db.query(TodoDB), TodoDB).order_by(TodoDB.change_seq, TodoDB.id)
+    if todos_pos:
+        query = query.filter(tuple_(TodoDB.change_seq, TodoDB.id) > tuple_(*todos_pos))
+    changed = query.limit(limit + 1).all()
+
+    query = changes_horizon(
+        db, db.query(TombstoneDB.change_seq, TombstoneDB.id, TombstoneDB.todo_id), TombstoneDB
+    ).order_by(TombstoneDB.change_seq, TombstoneDB.id)
+    if tombstones_pos:
+        query = query.filter(tuple_(TombstoneDB.change_seq, TombstoneDB.id) > tuple_(*tombstones_pos))
+    deleted = query.limit(limit + 1).all()
+
+    has_more = len(changed) > limit or len(deleted) > limit
+    changed, deleted = changed[:limit], deleted[:limit]
+    if changed:
+        todos_pos = (changed[-1].change_seq, changed[-1].id)
+    if deleted:
+        tombstones_pos = (deleted[-1].change_seq, deleted[-1].id)
+    return {
+        "changed": changed,
+        "deleted": [row.todo_id for row in deleted],
+        "cursor": encode_changes_cursor(todos_pos, tombstones_pos),
+        "has_more": has_more,
+    }
+
+
+def add_tombstones(db: Session, todo_ids: List[int]):
+    if todo_ids:
+        db.execute(insert(TombstoneDB), [{"todo_id": todo_id} for todo_id in todo_ids])
+
+
+def prune_tombstones(db: Session, cutoff: datetime, limit: int) -> int:
+    # najstarsze tombstone'y, jedna krótka transakcja na paczkę
+    oldest = (
+        select(TombstoneDB.id)
+        .where(TombstoneDB.deleted_at < cutoff)
+        .order_by(TombstoneDB.deleted_at, TombstoneDB.id)
+        .limit(limit)
+    )
+    pruned = db.execute(delete(TombstoneDB).where(TombstoneDB.id.in_(oldest))).rowcount
+    db.commit()
+    return pruned
+
+
+def prune_applied_operations(db: Session, cutoff: datetime, limit: int) -> int:
+    oldest = (
+        select(AppliedOperationDB.key)
+        .where(AppliedOperationDB.applied_at < cutoff)
+        .order_by(AppliedOperationDB.applied_at)
+        .limit(limit)
+    )
+    pruned = db.execute(delete(AppliedOperationDB).where(AppliedOperationDB.key.in_(oldest))).rowcount
+    db.commit()
+    return pruned
+
+
+def fetch_todo(db: Session, todo_id: int):
+    return db.query(TodoDB).filter(TodoDB.id == todo_id).first()
+
+
+def change_event(changed=(), deleted=()) -> dict:
+    return {
+        "changed": [TodoResponse.model_validate(todo).model_dump(mode="json") for todo in changed],
+        "deleted": list(deleted),
+    }
+
+
+def commit_changes(db: Session, changed=(), deleted=()):
+    # commit zapisu do todos. Na PostgreSQL zdarzenie idzie przez pg_notify jeszcze w tej samej
+    # transakcji (z wierszy z RETURNING) - NOTIFY dochodzi do słuchaczy dopiero po commicie,
+    # a przy rollbacku wcale, i nie kosztuje drugiego commitu. Gotowe zdarzenie zostaje
+    # w db.info dla publish_changes, żeby nie serializować todo drugi raz.
+    event = change_event(changed, deleted)
+    if PG_NOTIFY and (event["changed"] or event["deleted"]):
+        notify_pg(db, notify_payloads(event))
+    db.commit()
+    db.info["change_event"] = event
+
+
+# Zapisy pojedynczych todo to jedno zapytanie z RETURNING - bez SELECT przed
+# i bez refresh po commicie. 0 zwróconych wierszy = nie ma takiego id (404).
+
+def insert_todo(db: Session, title: str, client_key: Optional[str] = None):
+    # zwraca (todo, czy utworzone) - z kluczem, który już był, oddajemy istniejące zadanie.
+    # Bez rollbacku: ten wygasiłby obiekt, a odczyt pól przy serializacji to nowy SELECT
+    # (w trybie async poza run_db - MissingGreenlet); transakcję zamknie close_db
+    if client_key:
+        existing = fetch_todo_by_key(db, client_key)
+        if existing:
+            return existing, False
+    try:
+        db_todo = db.scalars(insert(TodoDB).values(title=title, client_key=client_key).returning(TodoDB)).one()
+        commit_changes(db, changed=[db_todo])
+    except IntegrityError:
+        # ten sam klucz wstawiło równolegle inne żądanie
+        db.rollback()
+        return fetch_todo_by_key(db, client_key), False
+    return db_todo, True
+
+
+def fetch_todo_by_key(db: Session, client_key: str):
+    return db.scalars(select(TodoDB).where(TodoDB.client_key == client_key)).first()
+
+
+def update_todo_values(db: Session, todo_id: int, update_data: dict):
+    return db.scalars(
+        update(TodoDB)
+        .where(TodoDB.id == todo_id)
+        .values(**update_data, updated_at=datetime.utcnow())
+        .returning(TodoDB)
+        # "fetch" poprawia zadanie, jeśli już jest w sesji (np. utworzone wcześniej w tej samej
+        # paczce operacji) - wartości bierze z RETURNING, bez dodatkowego SELECT
+        .execution_options(synchronize_session="fetch")
+    ).first()
+
+
+def update_todo_row(db: Session, todo_id: int, update_data: dict):
+    db_todo = update_todo_values(db, todo_id, update_data)
+    commit_changes(db, changed=[db_todo] if db_todo else [])
+    return db_todo
+
+
+def update_todo_rows_grouped(db: Session, updates: list) -> list:
+    # paczka PUT-ów z różnych żądań (każde id raz) jako jedno UPDATE ... SET pole = CASE id ...
+    # z RETURNING - jeden commit (fsync) i jedna podróż do bazy zamiast wielu;
+    # wynik dla każdego: todo, None (brak id) albo wyjątek
+    values = {}
+    for field in {field for _, update_data in updates for field in update_data}:
+        whens = {todo_id: update_data[field] for todo_id, update_data in updates if field in update_data}
+        values[field] = case(whens, value=TodoDB.id, else_=getattr(TodoDB, field))
+    try:
+        db_todos = {
+            todo.id: todo
+            for todo in db.scalars(
+                update(TodoDB)
+                .where(TodoDB.id.in_([todo_id for todo_id, _ in updates]))
+                .values(**values, updated_at=datetime.utcnow())
+                .returning(TodoDB)
+                .execution_options(synchronize_session=False)
+            )
+        }
+        commit_changes(db, changed=list(db_todos.values()))
+        return [db_todos.get(todo_id) for todo_id, _ in updates]
+    except Exception:
+        db.rollback()
+    # coś w paczce padło - powtarzamy z savepointem na każdy update, żeby błąd dostało
+    # tylko żądanie, które go spowodowało
+    results = []
+    for todo_id, update_data in updates:
+        try:
+            with db.begin_nested():
+                results.append(update_todo_values(db, todo_id, update_data))
+        except Exception as e:
+            results.append(e)
+    commit_changes(db, changed=[result for result in results if isinstance(result, TodoDB)])
+    return results
+
+
+def delete_todo_row(db: Session, todo_id: int) -> bool:
+    deleted_id = db.scalar(delete(TodoDB).where(TodoDB.id == todo_id).returning(TodoDB.id))
+    if deleted_id is None:
+        db.rollback()
+        return False
+    # tombstone w tej samej transakcji co DELETE
+    add_tombstones(db, [deleted_id])
+    commit_changes(db, deleted=[deleted_id])
+    return True
+
+
+# Operacje wsadowe - każda to jedna transakcja i jeden commit
+
+def insert_todos(db: Session, titles: List[str]):
+    db_todos = [TodoDB(title=title) for title in titles]
+    db.add_all(db_todos)
+    db.flush()
+    commit_changes(db, changed=db_todos)
+    return db_todos
+
+
+def apply_operations(db: Session, operations: List[TodoOperation]):
+    try:
+        return apply_operations_once(db, operations)
+    except IntegrityError:
+        # te same operacje zapisało równolegle inne żądanie (klucz operacji albo create) -
+        # po rollbacku widzimy już jego klucze i tylko zwracamy wyniki
+        db.rollback()
+        return apply_operations_once(db, operations)
+
+
+def apply_operations_once(db: Session, operations: List[TodoOperation]):
+    # dziennik operacji klienta (np. zebrany offline) po kolei, w jednej transakcji.
+    # Operacja, której klucz już jest w todo_operations, nie jest wykonywana drugi raz -
+    # ponowiona paczka po zgubionej odpowiedzi dostaje obecny stan zadania (albo "missing",
+    # jeśli już go nie ma) i nie cofa zmian zrobionych w międzyczasie
+    keys = {operation.ref for operation in operations if operation.ref}
+    keys |= {operation.key for operation in operations if operation.op == "create"}
+    ids_by_key = {}
+    if keys:
+        ids_by_key = dict(db.execute(select(TodoDB.client_key, TodoDB.id).where(TodoDB.client_key.in_(keys))).all())
+    applied = dict(db.execute(
+        select(AppliedOperationDB.key, AppliedOperationDB.todo_id)
+        .where(AppliedOperationDB.key.in_([operation.key for operation in operations]))
+    ).all())
+
+    results, changed, deleted, recorded = [], {}, [], {}
+    for operation in operations:
+        if operation.key in applied:
+            todo_id = applied[operation.key]
+            db_todo = None
+            if todo_id is not None and todo_id not in deleted:
+                db_todo = changed.get(todo_id) or db.get(TodoDB, todo_id)
+            if operation.op in ("delete", "clear_completed") or db_todo is not None:
+                results.append({"key": operation.key, "status": "ok", "todo": db_todo})
+            else:
+                results.append({"key": operation.key, "status": "missing", "todo": None})
+            continue
+        result = apply_operation(db, operation, ids_by_key, changed, deleted)
+        results.append(result)
+        # też "missing" - powtórka i tak da ten sam wynik, a klucz nie wróci drugi raz
+        todo_id = operation.id if operation.id is not None else ids_by_key.get(operation.ref or operation.key)
+        applied[operation.key] = recorded[operation.key] = todo_id
+
+    if recorded:
+        db.execute(insert(AppliedOperationDB), [{"key": key, "todo_id": todo_id} for key, todo_id in recorded.items()])
+    add_tombstones(db, deleted)
+    commit_changes(db, changed=list(changed.values()), deleted=deleted)
+    return results, list(changed.values()), deleted
+
+
+def apply_operation(db: Session, operation: TodoOperation, ids_by_key: dict, changed: dict, deleted: list) -> dict:
+    # create z kluczem, który już jest w bazie, nie tworzy drugiego zadania, a update/delete
+    # nieistniejącego zadania to "missing"
+    if operation.op == "create":
+        todo_id = ids_by_key.get(operation.key)
+        if todo_id is None:
+            db_todo = db.scalars(
+                insert(TodoDB).values(title=operation.title, client_key=operation.key).returning(TodoDB)
+            ).one()
+            ids_by_key[operation.key] = db_todo.id
+            changed[db_todo.id] = db_todo
+        else:
+            db_todo = changed.get(todo_id) or db.get(TodoDB, todo_id)
+        return {"key": operation.key, "status": "ok", "todo": db_todo}
+    if operation.op == "clear_completed":
+        deleted_ids = db.scalars(delete(TodoDB).where(TodoDB.completed == True).returning(TodoDB.id)).all()
+        for todo_id in deleted_ids:
+            changed.pop(todo_id, None)
+        deleted.extend(deleted_ids)
+        return {"key": operation.key, "status": "ok", "todo": None}
+
+    todo_id = operation.id if operation.id is not None else ids_by_key.get(operation.ref)
+    missing = {"key": operation.key, "status": "missing", "todo": None}
+    if todo_id is None:
+        return missing
+    if operation.op == "update":
+        update_data = operation.model_dump(include={"title", "completed"}, exclude_none=True)
+        db_todo = update_todo_values(db, todo_id, update_data) if update_data else db.get(TodoDB, todo_id)
+        if db_todo is None:
+            return missing
+        changed[todo_id] = db_todo
+        return {"key": operation.key, "status": "ok", "todo": db_todo}
+    if db.scalar(delete(TodoDB).where(TodoDB.id == todo_id).returning(TodoDB.id)) is None:
+        return missing
+    deleted.append(todo_id)
+    changed.pop(todo_id, None)
+    return {"key": operation.key, "status": "ok", "todo": None}
+
+
+ARCHIVE_COLUMNS = ("id", "title", "completed", "created_at", "updated_at")
+
+
+def archive_batch(db: Session, cutoff: datetime, limit: int) -> List[int]:
+    # jedna paczka w jednej transakcji: kandydatów blokujemy (na PostgreSQL ze SKIP LOCKED,
+    # więc przejścia z kilku workerów biorą różne wiersze, a równoległy PUT czeka na commit),
+    # kopiujemy do archiwum przez INSERT ... SELECT i kasujemy z todos z tombstone'ami,
+    # żeby klienci dostali je w /todos/changes jako usunięte
+    ids = list(db.scalars(
+        select(TodoDB.id)
+        .where(TodoDB.completed == True, TodoDB.updated_at < cutoff)
+        .order_by(TodoDB.updated_at, TodoDB.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ))
+    if not ids:
+        db.rollback()
+        return []
+    columns = [getattr(TodoDB, name) for name in ARCHIVE_COLUMNS]
+    db.execute(
+        insert(ArchivedTodoDB).from_select(
+            [*ARCHIVE_COLUMNS, "archived_at"],
+            select(*columns, literal(datetime.utcnow())).where(TodoDB.id.in_(ids)),
+        )
+    )
+    db.execute(delete(TodoDB).where(TodoDB.id.in_(ids)))
+    add_tombstones(db, ids)
+    commit_changes(db, deleted=ids)
+    return ids
+
+
+def update_todos_rows(db: Session, items: List[dict]):
+    ids = [item["id"] for item in items]
+    db_todos = {todo.id: todo for todo in db.query(TodoDB).filter(TodoDB.id.in_(ids)).all()}
+    # brak choćby jednego id = nic nie zapisujemy
+    missing = [todo_id for todo_id in ids if todo_id not in db_todos]
+    if missing:
+        db.rollback()
+        return None, missing
+
+    now = datetime.utcnow()
+    for item in items:
+        db_todo = db_todos[item["id"]]
+        for field, value in item.items():
+            if field != "id":
+                setattr(db_todo, field, value)
+        db_todo.updated_at = now
+    db.flush()
+    commit_changes(db, changed=[db_todos[todo_id] for todo_id in ids])
+    return [db_todos[todo_id] for todo_id in ids], None
+
+
+def delete_todos_rows(db: Session, ids: List[int]) -> List[int]:
+    deleted_ids = db.scalars(delete(TodoDB).where(TodoDB.id.in_(ids)).returning(TodoDB.id)).all()
+    add_tombstones(db, deleted_ids)
+    commit_changes(db, deleted=deleted_ids)
+    return deleted_ids
+
+
+def delete_todos_by_status(db: Session, completed: bool) -> List[int]:
+    # jedno DELETE ... WHERE completed = ? zamiast kasowania wiersz po wierszu
+    deleted_ids = db.scalars(delete(TodoDB).where(TodoDB.completed == completed).returning(TodoDB.id)).all()
+    add_tombstones(db, deleted_ids)
+    commit_changes(db, deleted=deleted_ids)
+    return deleted_ids
+
+
+def count_todos(db: Session):
+    # jeden skan: COUNT(*) i COUNT(*) FILTER (WHERE completed) w tym samym zapytaniu
+    total, completed = db.query(
+        func.count(TodoDB.id),
+        func.count(TodoDB.id).filter(TodoDB.completed == True),
+    ).one()
+    return total, completed
+
+
+# Wersja kolekcji todo - rośnie przy każdym zapisie i służy jako ETag odczytów.
+# Licznik jest per proces, dlatego w ETag siedzi też losowe id instancji: po restarcie
+# stare ETagi przestają pasować. Na PostgreSQL zapisy z innych workerów dochodzą przez
+# NOTIFY i też podbijają wersję, bez PostgreSQL zakładamy jeden proces uvicorna.
+INSTANCE_ID = uuid.uuid4().hex[:8]
+_collection = {"version": 0, "last_write": float("-inf")}
+
+# Cache statystyk w procesie. Wynik policzony przed zapisem nie trafi do cache
+# nawet jak zapytanie skończy się już po nim, bo wersja kolekcji się nie zgodzi.
+_stats_cache = {"value": None, "expires": 0.0}
+
+
+def todos_changed():
+    # wołamy po każdym udanym zapisie do tabeli todos
+    _collection["version"] += 1
+    _collection["last_write"] = time.monotonic()
+    _stats_cache["value"] = None
+
+
+# Zdarzenia o zmianach dla subskrybentów /todos/events. Każde zdarzenie to
+# {"changed": [...], "deleted": [...]} albo {"resync": True}, kiedy klient
+# powinien sam dociągnąć zmiany przez /todos/changes.
+class Broadcaster:
+    def __init__(self):
+        self.subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=EVENTS_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def publish(self, event: dict):
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # klient nie nadąża - wyrzucamy zaległe zdarzenia i każemy mu się zsynchronizować
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"resync": True})
+
+
+broadcaster = Broadcaster()
+
+
+# Cache GET /todos/{id}. Trzymamy gotowe dicty odpowiedzi; backend musi mieć
+# get/set/fill/delete/clear, a "shared" mówi czy widzą go wszystkie workery. set wołają
+# zapisy (świeży stan z bazy), fill - GET po chybieniu (stan sprzed ewentualnego zapisu).
+TODO_CACHE_HITS = Counter("todo_cache_hits_total", "GET /todos/{id} served from cache")
+TODO_CACHE_MISSES = Counter("todo_cache_misses_total", "GET /todos/{id} cache misses")
+
+
+class MemoryTodoCache:
+    shared = False
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()  # id -> (wygasa, todo)
+
+    async def get(self, todo_id: int) -> Optional[dict]:
+        item = self.items.get(todo_id)
+        if item is None:
+            return None
+        expires, todo = item
+        if time.monotonic() >= expires:
+            del self.items[todo_id]
+            return None
+        self.items.move_to_end(todo_id)
+        return todo
+
+    async def set(self, todo_id: int, todo: dict):
+        self.items[todo_id] = (time.monotonic() + self.ttl, todo)
+        self.items.move_to_end(todo_id)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+    async def fill(self, todo_id: int, todo: dict):
+        # starą wersję wpisaną tuż przed zapisem z innego workera poprawi jego NOTIFY
+        await self.set(todo_id, todo)
+
+    async def delete(self, todo_ids):
+        for todo_id in todo_ids:
+            self.items.pop(todo_id, None)
+
+    async def clear(self):
+        self.items.clear()
+
+    def apply(self, event: dict):
+        # to samo co update_todo_cache, ale bez await - do wołania z handle_notification
+        if event.get("resync"):
+            self.items.clear()
+            return
+        for todo in event["changed"]:
+            self.items[todo["id"]] = (time.monotonic() + self.ttl, todo)
+            self.items.move_to_end(todo["id"])
+        for todo_id in event["deleted"]:
+            self.items.pop(todo_id, None)
+        while len(self.items) > self.max_size:
+            self.items.popitem(last=False)
+
+
+class RedisTodoCache:
+    # wymaga pakietu redis (nie ma go w requirements.txt, instalujemy gdy jest potrzebny);
+    # rozmiar ogranicza maxmemory + polityka LRU po stronie Redisa
+    shared = True
+
+    def __init__(self, url: str, ttl: float, fill_ttl: float):
+        try:
+            import redis.asyncio as redis
+        except ImportError:
+            raise RuntimeError("TODO_CACHE_URL requires the redis package")
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.fill_ttl = min(fill_ttl, ttl)
+
+    def key(self, todo_id: int) -> str:
+        return f"todo:{todo_id}"
+
+    async def get(self, todo_id: int) -> Optional[dict]:
+        value = await self.client.get(self.key(todo_id))
+        return json.loads(value) if value else None  # "null" = niedawno usunięte, czytamy z bazy
+
+    async def set(self, todo_id: int, todo: dict):
+        await self.client.set(self.key(todo_id), json_dumps(todo), px=int(self.ttl * 1000))
+
+    async def fill(self, todo_id: int, todo: dict):
+        # worker mógł przeczytać starą wersję, zanim inny worker zapisał nową i wstawił ją do
+        # Redisa (jego NOTIFY tu jeszcze nie doszło, więc sprawdzenie wersji w get_todo nic nie
+        # da). Dlatego tylko SET NX - nie nadpisze wpisu z zapisu ani znacznika usunięcia -
+        # i z krótkim TTL, na wypadek gdyby zapis skończył się między odczytem a wypełnieniem.
+        await self.client.set(self.key(todo_id), json_dumps(todo), px=int(self.fill_ttl * 1000), nx=True)
+
+    async def delete(self, todo_ids):
+        # zamiast DEL krótki znacznik "null", żeby fill ze starym odczytem nie wskrzesił zadania
+        if todo_ids:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for todo_id in todo_ids:
+                    pipe.set(self.key(todo_id), b"null", px=int(self.fill_ttl * 1000))
+                await pipe.execute()
+
+    async def clear(self):
+        async for key in self.client.scan_iter("todo:*"):
+            await self.client.delete(key)
+
+
+if TODO_CACHE_URL:
+    todo_cache = RedisTodoCache(TODO_CACHE_URL, TODO_CACHE_TTL, TODO_CACHE_FILL_TTL)
+else:
+    todo_cache = MemoryTodoCache(TODO_CACHE_SIZE, TODO_CACHE_TTL)
+
+
+async def update_todo_cache(event: dict):
+    # zapisane todo od razu wkładamy do cache, usunięte wyrzucamy
+    if event.get("resync"):
+        await todo_cache.clear()
+        return
+    for todo in event["changed"]:
+        await todo_cache.set(todo["id"], todo)
+    await todo_cache.delete(event["deleted"])
+
+
+def notify_payloads(event: dict) -> List[str]:
+    # NOTIFY ma limit ~8000 bajtów - większe zdarzenie dzielimy na kilka mniejszych,
+    # a resync wysyłamy dopiero gdy nie mieści się nawet jedno todo
+    payload = json.dumps(event)
+    if len(payload) <= MAX_NOTIFY_PAYLOAD:
+        return [payload]
+    # json.dumps zamienia znaki spoza ASCII na \uXXXX, więc długość napisu = liczba bajtów
+    limit = MAX_NOTIFY_PAYLOAD - len(json.dumps({"changed": [], "deleted": []}))
+    payloads, chunk, size = [], {"changed": [], "deleted": []}, 0
+    for key in ("changed", "deleted"):
+        for item in event[key]:
+            item_size = len(json.dumps(item)) + 2
+            if item_size > limit:
+                return [json.dumps({"resync": True})]
+            if size + item_size > limit:
+                payloads.append(json.dumps(chunk))
+                chunk, size = {"changed": [], "deleted": []}, 0
+            chunk[key].append(item)
+            size += item_size
+    payloads.append(json.dumps(chunk))
+    return payloads
+
+
+def notify_pg(db: Session, payloads: List[str]):
+    # wszystkie części jednym zapytaniem, w transakcji zapisu (commit_changes) - dochodzą
+    # do słuchaczy razem z commitem, w kolejności
+    params = {"channel": EVENTS_CHANNEL}
+    calls = []
+    for i, payload in enumerate(payloads):
+        params[f"payload_{i}"] = payload
+        calls.append(f"pg_notify(:channel, :payload_{i})")
+    db.execute(text("SELECT " + ", ".join(calls)), params)
+
+
+# Cache todo poprawiamy zawsze PRZED podbiciem wersji: GET /todos/{id} pomiędzy dostałby nowy
+# ETag ze starą treścią, a potem 304 na nieaktualne dane aż do następnego zapisu.
+
+async def publish_changes(db, changed=(), deleted=()):
+    # wołamy po każdym udanym zapisie - poprawia cache, podbija wersję i bez PostgreSQL rozsyła
+    # zdarzenie; na PostgreSQL poszło już NOTIFY z transakcji zapisu i wróci przez LISTEN
+    event = db.info.pop("change_event", None) or change_event(changed, deleted)
+    if PG_NOTIFY:
+        # nowe wersje wpisują zdarzenia z LISTEN, po kolei w kolejności commitów - tu tylko
+        # wyrzucamy zapisane todo, bo wpisanie ich tutaj mogłoby przykryć nowszy zapis z innego
+        # workera, którego NOTIFY już doszło
+        await todo_cache.delete([todo["id"] for todo in event["changed"]] + list(event["deleted"]))
+    else:
+        await update_todo_cache(event)
+    todos_changed()
+    if not PG_NOTIFY:
+        broadcaster.publish(event)
+
+
+# zdarzenia dla współdzielonego cache wpisujemy po kolei - każde czeka na poprzednie
+_notifications = {"last": None}
+
+
+def handle_notification(payload: str):
+    # NOTIFY przychodzi też dla zapisów z tego workera - podwójne podbicie wersji nie szkodzi
+    event = json.loads(payload)
+    if not todo_cache.shared:
+        # cache w pamięci każdego workera poprawiamy od razu, synchronicznie
+        todo_cache.apply(event)
+        todos_changed()
+        broadcaster.publish(event)
+        return
+    _notifications["last"] = asyncio.create_task(apply_notification(event, _notifications["last"]))
+
+
+async def apply_notification(event: dict, previous):
+    # współdzielony cache: każdy worker wpisuje zdarzenie sam (to kilka SET-ów na zapis zamiast
+    # jednego), bo nie wie, czy zapisujący już to zrobił - a wersję podbija dopiero potem
+    if previous:
+        try:
+            await previous
+        except Exception:
+            pass
+    try:
+        await update_todo_cache(event)
+    except Exception as e:
+        print(f"updating todo cache failed: {e}")
+    todos_changed()
+    broadcaster.publish(event)
+
+
+async def pg_listen_async():
+    # asyncpg: osobne połączenie z LISTEN, przy zerwaniu łączymy się od nowa
+    while True:
+        try:
+            async with engine.connect() as connection:
+                raw = await connection.get_raw_connection()
+                driver_connection = raw.driver_connection
+                await driver_connection.add_listener(
+                    EVENTS_CHANNEL, lambda conn, pid, channel, payload: handle_notification(payload)
+                )
+                while not driver_connection.is_closed():
+                    await asyncio.sleep(EVENTS_HEARTBEAT_INTERVAL)
+        except Exception as e:
+            print(f"LISTEN connection lost: {e}")
+        await asyncio.sleep(1)
+
+
+def pg_listen_sync(loop):
+    # psycopg2: połączenie odpięte z puli, czekamy na NOTIFY przez select() w osobnym wątku
+    while True:
+        try:
+            raw = engine.raw_connection()
+            connection = raw.driver_connection
+            raw.detach()
+            connection.autocommit = True
+            connection.cursor().execute(f"LISTEN {EVENTS_CHANNEL}")
+            while True:
+                if io_select.select([connection], [], [], EVENTS_HEARTBEAT_INTERVAL) == ([], [], []):
+                    continue
+                connection.poll()
+                while connection.notifies:
+                    notify = connection.notifies.pop(0)
+                    loop.call_soon_threadsafe(handle_notification, notify.payload)
+        except Exception as e:
+            print(f"LISTEN connection lost: {e}")
+        time.sleep(1)
+
+
+TODO_FIELDS = list(TodoResponse.model_fields)
+
+
+def todo_columns(todos) -> dict:
+    return {field: [getattr(todo, field) for todo in todos] for field in TODO_FIELDS}
+
+
+def compact_media_type(request: Request) -> Optional[str]:
+    accept = request.headers.get("accept", "")
+    if msgpack and MSGPACK_MEDIA_TYPE in accept:
+        return MSGPACK_MEDIA_TYPE
+    if COLUMNS_MEDIA_TYPE in accept:
+        return COLUMNS_MEDIA_TYPE
+    return None
+
+
+def msgpack_default(value):
+    # daty w bazie są naiwne, ale w UTC
+    if isinstance(value, datetime):
+        return msgpack.Timestamp.from_datetime(value.replace(tzinfo=timezone.utc))
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def compact_response(media_type: str, payload: dict, etag: str) -> Response:
+    if media_type == MSGPACK_MEDIA_TYPE:
+        body = msgpack.packb(payload, default=msgpack_default)
+    else:
+        body = json_dumps(payload)
+    return Response(body, media_type=media_type, headers={"ETag": etag, "Vary": "Accept"})
+
+
+def current_etag() -> str:
+    return f'W/"{INSTANCE_ID}-{_collection["version"]}"'
+
+
+def not_modified(request: Request, etag: str) -> Optional[Response]:
+    # 304 bez dotykania bazy, jeśli klient ma już aktualną wersję
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return None
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    if "*" in tags or etag in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+class UpdateCoalescer:
+    def __init__(self, delay: float, max_size: int, concurrency: int):
+        self.delay = delay
+        self.max_size = max_size
+        self.concurrency = concurrency
+        self.queue = None
+        self.task = None
+        self.slots = None
+        # id todo z paczek, które jeszcze się zapisują, i same zadania zapisu
+        self.in_flight = set()
+        self.flushes = set()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.slots = asyncio.Semaphore(self.concurrency)
+        self.task = asyncio.create_task(self.run())
+
+    def stop(self):
+        self.task.cancel()
+
+    async def submit(self, todo_id: int, update_data: dict):
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((todo_id, update_data, future))
+        return await future
+
+    def take(self, item, batch: list, ids: set, waiting: list):
+        # kolejny zapis tego samego todo czeka na następną paczkę - każde żądanie dostaje
+        # stan po swoim zapisie, a zapisy jednego todo nie wyprzedzają się w równoległych paczkach
+        if item[0] in ids or item[0] in self.in_flight:
+            waiting.append(item)
+        else:
+            ids.add(item[0])
+            batch.append(item)
+
+    async def run(self):
+        # zapytania paczki liczą się w metrykach jako update_todo
+        current_endpoint.set("update_todo")
+        loop = asyncio.get_running_loop()
+        waiting = []
+        while True:
+            # paczkę zbieramy dopiero, gdy jest wolne miejsce na jej zapis
+            await self.slots.acquire()
+            batch, ids = [], set()
+            deadline = None
+            while len(batch) < self.max_size:
+                if not batch:
+                    retry, waiting = waiting, []
+                    for item in retry:
+                        self.take(item, batch, ids, waiting)
+                if batch and deadline is None:
+                    deadline = loop.time() + self.delay
+                if deadline is None:
+                    # nic do zapisu - czekamy na nowe żądanie; zaległe sprawdzamy co delay
+                    timeout = self.delay if waiting else None
+                else:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    if deadline is None:
+                        continue
+                    break
+                self.take(item, batch, ids, waiting)
+            self.in_flight |= ids
+            flush = asyncio.create_task(self.flush(batch, ids))
+            self.flushes.add(flush)
+            flush.add_done_callback(self.flushes.discard)
+
+    async def flush(self, batch: list, ids: set):
+        db = SessionLocal()
+        results = None
+        try:
+            results = await run_db(db, update_todo_rows_grouped, [(todo_id, data) for todo_id, data, _ in batch])
+            await publish_changes(db, changed=[result for result in results if isinstance(result, TodoDB)])
+        except Exception as e:
+            if results is None:
+                # paczka nie doszła do bazy (np. zerwane połączenie) - błąd dostają wszyscy
+                results = [e] * len(batch)
+            else:
+                # zapisy są w bazie, nie udało się tylko rozesłać zdarzeń
+                print(f"publishing batched updates failed: {e}")
+        finally:
+            await close_db(db)
+            self.in_flight -= ids
+            self.slots.release()
+        for (_, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+update_coalescer = (
+    UpdateCoalescer(WRITE_BATCH_DELAY, WRITE_BATCH_MAX_SIZE, WRITE_BATCH_CONCURRENCY) if WRITE_COALESCING else None
+)
+
+
+async def archive_completed(db) -> dict:
+    # przenosimy paczkami po ARCHIVE_BATCH_SIZE, każda we własnej krótkiej transakcji, żeby nie
+    # trzymać blokad na tysiącach wierszy; po ARCHIVE_MAX_BATCHES oddajemy resztę następnemu przejściu
+    cutoff = datetime.utcnow() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    archived = 0
+    for _ in range(ARCHIVE_MAX_BATCHES):
+        ids = await run_db(db, archive_batch, cutoff, ARCHIVE_BATCH_SIZE)
+        if ids:
+            archived += len(ids)
+            await publish_changes(db, deleted=ids)
+        if len(ids) < ARCHIVE_BATCH_SIZE:
+            return {"archived": archived, "has_more": False}
+    return {"archived": archived, "has_more": True}
+
+
+async def archive_job(db):
+    result = await archive_completed(db)
+    if result["archived"]:
+        print(f"archived {result['archived']} completed todos")
+
+
+async def prune_job(db):
+    # usunięcia i klucze operacji starsze niż retencja - klienci z tak starym kursorem
+    # i tak dostaną 410 i pobiorą wszystko od nowa
+    cutoff = datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    for prune in (prune_tombstones, prune_applied_operations):
+        while True:
+            pruned = await run_db(db, prune, cutoff, TOMBSTONE_PRUNE_BATCH_SIZE)
+            if pruned < TOMBSTONE_PRUNE_BATCH_SIZE:
+                break
+
+
+def start_periodic(interval: float, job, name: str):
+    # zadanie w tle co interval sekund (0 = wyłączone), na własnej sesji; pierwsze przejście
+    # dopiero po interval, żeby nie obciążać startu. Zapytania liczą się w metrykach jako name.
+    if interval <= 0:
+        return None
+
+    async def loop():
+        current_endpoint.set(name)
+        while True:
+            await asyncio.sleep(interval)
+            db = SessionLocal()
+            try:
+                await job(db)
+            except Exception as e:
+                print(f"{name} failed: {e}")
+            finally:
+                await close_db(db)
+
+    return asyncio.create_task(loop())
 
 
 # Endpointy:
+# liveness - proces żyje i obsługuje żądania; bez bazy, żeby chwilowa awaria bazy
+# nie kończyła się restartem kontenera
 @app.get("/health")
 async def health_check():
     return {"status": "healthy", "timestamp": datetime.utcnow()}
 
 
-@app.get("/todos", response_model=List[TodoResponse])
-async def get_todos(db: Session = Depends(get_db)):
-    return db.query(TodoDB).order_by(TodoDB.created_at.desc()).all()
+def check_ready(db: Session):
+    # zapytanie do tabeli todos - przy okazji widać, czy migracje zostały wykonane
+    db.execute(select(TodoDB.id).limit(1)).all()
+
+
+# readiness - czy instancja może już dostawać ruch (baza odpowiada i ma schemat)
+@app.get("/ready")
+async def readiness_check(response: Response, db: Session = Depends(get_db)):
+    try:
+        await run_db(db, check_ready)
+    except Exception as e:
+        response.status_code = 503
+        return {"status": "unavailable", "error": str(e)}
+    return {"status": "ready"}
+
+
+@app.get("/todos", response_model=TodoPage)
+async def get_todos(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    completed: Optional[bool] = None,
+    db: Session = Depends(get_read_db),
+):
+    # ETag bierzemy przed zapytaniem - jak w trakcie wpadnie zapis, klient i tak dostanie świeże dane później
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    page = await run_db(db, list_todos, limit, after, completed)
+    media_type = compact_media_type(request)
+    if media_type:
+        return compact_response(
+            media_type, {"items": todo_columns(page["items"]), "next_cursor": page["next_cursor"]}, etag
+        )
+    response.headers["ETag"] = etag
+    response.headers["Vary"] = "Accept"
+    return page
+
+
+@app.delete("/todos")
+async def delete_todos(completed: bool, db: Session = Depends(get_db)):
+    # np. DELETE /todos?completed=true - "clear completed" po stronie serwera
+    deleted_ids = await run_db(db, delete_todos_by_status, completed)
+    await publish_changes(db, deleted=deleted_ids)
+    return {"deleted": len(deleted_ids)}
+
+
+# /todos/changes, /todos/batch i /todos/archive muszą być przed /todos/{todo_id}, inaczej trafią jako todo_id
+@app.get("/todos/changes", response_model=TodoChanges)
+async def get_todos_changes(
+    request: Request,
+    response: Response,
+    since: Optional[str] = None,
+    limit: int = Query(DEFAULT_CHANGES_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    db: Session = Depends(get_db),
+):
+    # bez since zwracamy tylko aktualny kursor - klient pobiera go przed pełnym
+    # załadowaniem listy, a potem pyta już tylko o zmiany
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    if not since:
+        changes = {"changed": [], "deleted": [], "cursor": await run_db(db, changes_head), "has_more": False}
+    else:
+        changes = await run_db(db, list_changes, since, limit)
+    media_type = compact_media_type(request)
+    if media_type:
+        return compact_response(media_type, {**changes, "changed": todo_columns(changes["changed"])}, etag)
+    response.headers["ETag"] = etag
+    response.headers["Vary"] = "Accept"
+    return changes
+
+
+@app.get("/todos/search", response_model=List[TodoResponse])
+async def search_todos(
+    request: Request,
+    response: Response,
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(DEFAULT_SEARCH_LIMIT, ge=1, le=MAX_SEARCH_LIMIT),
+    db: Session = Depends(get_read_db),
+):
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return await run_db(db, find_todos, q, limit)
+
+
+@app.get("/todos/stream")
+async def get_todos_stream(request: Request):
+    # cała lista jako strumień JSON (tablica) albo NDJSON, gdy klient prosi o application/x-ndjson;
+    # sesję otwieramy w generatorze, bo musi żyć dłużej niż sam endpoint
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+    return StreamingResponse(
+        stream_todos(ndjson),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+        headers={"ETag": etag},
+    )
+
+
+@app.get("/todos/events")
+async def get_todos_events(request: Request):
+    # Server-Sent Events: zdarzenia o zmianach + heartbeat, po którym klient poznaje że backend żyje
+    async def event_stream():
+        queue = broadcaster.subscribe()
+        try:
+            # heartbeat od razu na starcie, żeby klient nie czekał na pierwsze zdarzenie
+            yield "event: heartbeat\ndata: {}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_HEARTBEAT_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield "event: heartbeat\ndata: {}\n\n"
+                    continue
+                event_type = "resync" if event.get("resync") else "changes"
+                yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            broadcaster.unsubscribe(queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/todos/batch", response_model=List[TodoResponse])
+async def create_todos_batch(batch: TodoBatchCreate, db: Session = Depends(get_db)):
+    db_todos = await run_db(db, insert_todos, [todo.title for todo in batch.items])
+    await publish_changes(db, changed=db_todos)
+    return db_todos
+
+
+@app.post("/todos/operations", response_model=List[TodoOperationResult])
+async def apply_todos_operations(batch: TodoOperationBatch, db: Session = Depends(get_db)):
+    if any(operation.op == "create" and not operation.title for operation in batch.items):
+        raise HTTPException(status_code=422, detail="create requires title")
+    results, changed, deleted = await run_db(db, apply_operations, batch.items)
+    if changed or deleted:
+        await publish_changes(db, changed=changed, deleted=deleted)
+    return results
+
+
+@app.patch("/todos/batch", response_model=List[TodoResponse])
+async def update_todos_batch(batch: TodoBatchUpdate, db: Session = Depends(get_db)):
+    items = [item.dict(exclude_unset=True) for item in batch.items]
+    db_todos, missing = await run_db(db, update_todos_rows, items)
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Todos not found: {missing}")
+    await publish_changes(db, changed=db_todos)
+    return db_todos
+
+
+@app.delete("/todos/batch")
+async def delete_todos_batch(batch: TodoBatchDelete, db: Session = Depends(get_db)):
+    deleted_ids = await run_db(db, delete_todos_rows, batch.ids)
+    await publish_changes(db, deleted=deleted_ids)
+    return {"deleted": len(deleted_ids)}
+
+
+@app.get("/todos/archive", response_model=ArchivedTodoPage)
+async def get_archived_todos(
+    request: Request,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    db: Session = Depends(get_read_db),
+):
+    # archiwum zmienia się tylko razem z todos (przeniesienie bumpuje wersję), więc ETag ten sam
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+    return await run_db(db, list_archived_todos, limit, after)
+
+
+@app.post("/todos/archive", response_model=ArchiveRun)
+async def archive_todos(db: Session = Depends(get_db)):
+    # ręczne przejście archiwizacji, np. z crona (domyślnie ARCHIVE_INTERVAL=0)
+    return await archive_completed(db)
 
 
 @app.get("/todos/{todo_id}", response_model=TodoResponse)
-async def get_todo(todo_id: int, db: Session = Depends(get_db)):
-    todo = db.query(TodoDB).filter(TodoDB.id == todo_id).first()
+async def get_todo(todo_id: int, request: Request, response: Response, db: Session = Depends(get_read_db)):
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    todo = await todo_cache.get(todo_id)
+    if todo is not None:
+        TODO_CACHE_HITS.inc()
+        return todo
+    TODO_CACHE_MISSES.inc()
+
+    version = _collection["version"]
+    todo = await run_db(db, fetch_todo, todo_id)
     if not todo:
         raise HTTPException(status_code=404, detail="Todo not found")
+    todo = TodoResponse.model_validate(todo).model_dump(mode="json")
+    # jak w trakcie odczytu był zapis, nie wkładamy do cache być może starej wersji
+    if version == _collection["version"]:
+        await todo_cache.fill(todo_id, todo)
     return todo
 
 
 @app.post("/todos", response_model=TodoResponse)
-async def create_todo(todo: TodoCreate, db: Session = Depends(get_db)):
-    db_todo = TodoDB(title=todo.title)
-    db.add(db_todo)
-    db.commit()
-    db.refresh(db_todo)
+async def create_todo(
+    todo: TodoCreate,
+    idempotency_key: Optional[str] = Header(None, max_length=100),
+    db: Session = Depends(get_db),
+):
+    db_todo, created = await run_db(db, insert_todo, todo.title, idempotency_key)
+    if created:
+        await publish_changes(db, changed=[db_todo])
     return db_todo
 
 
 @app.put("/todos/{todo_id}", response_model=TodoResponse)
 async def update_todo(todo_id: int, todo_update: TodoUpdate, db: Session = Depends(get_db)):
-    db_todo = db.query(TodoDB).filter(TodoDB.id == todo_id).first()
+    update_data = todo_update.dict(exclude_unset=True)
+    if update_coalescer:
+        # commit i zdarzenie robi paczka
+        db_todo = await update_coalescer.submit(todo_id, update_data)
+    else:
+        db_todo = await run_db(db, update_todo_row, todo_id, update_data)
     if not db_todo:
         raise HTTPException(status_code=404, detail="Todo not found")
-
-    update_data = todo_update.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(db_todo, field, value)
-
-    db_todo.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(db_todo)
+    if not update_coalescer:
+        await publish_changes(db, changed=[db_todo])
     return db_todo
 
 
 @app.delete("/todos/{todo_id}")
 async def delete_todo(todo_id: int, db: Session = Depends(get_db)):
-    db_todo = db.query(TodoDB).filter(TodoDB.id == todo_id).first()
-    if not db_todo:
+    if not await run_db(db, delete_todo_row, todo_id):
         raise HTTPException(status_code=404, detail="Todo not found")
-
-    db.delete(db_todo)
-    db.commit()
+    await publish_changes(db, deleted=[todo_id])
     return {"message": "Todo deleted successfully"}
 
 
 @app.get("/todos/stats/summary")
-async def get_todos_stats(db: Session = Depends(get_db)):
-    total = db.query(TodoDB).count()
-    completed = db.query(TodoDB).filter(TodoDB.completed == True).count()
+async def get_todos_stats(request: Request, response: Response, db: Session = Depends(get_read_db)):
+    etag = current_etag()
+    cached = not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers["ETag"] = etag
+
+    if _stats_cache["value"] is not None and time.monotonic() < _stats_cache["expires"]:
+        return _stats_cache["value"]
+
+    version = _collection["version"]
+    total, completed = await run_db(db, count_todos)
     active = total - completed
 
-    return {
+    stats = {
         "total": total,
         "completed": completed,
         "active": active,
         "completion_rate": round((completed / total * 100) if total > 0 else 0, 2),
     }
+    if version == _collection["version"]:
+        _stats_cache["value"] = stats
+        _stats_cache["expires"] = time.monotonic() + STATS_CACHE_TTL
+    return stats
 
 
 # Do uruchomienia lokalnego uruchom:
 @app.get("/test-db")
 async def test_db(db: Session = Depends(get_db)):
     try:
-        count = db.query(TodoDB).count()
+        count = await run_db(db, lambda session: session.query(TodoDB).count())
         return {"todos_count": count}
     except Exception as e:
         return {"error": str(e)}
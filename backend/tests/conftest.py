@@ -0,0 +1,50 @@
+# Testy na SQLite: każdy test dostaje świeży plik bazy, w trybie sync (sqlite://)
+# i async (sqlite+aiosqlite://). Uruchomienie (z katalogu backend):
+#   pip install -r requirements-dev.txt
+#   python -m pytest -q
+# (pytest, httpx pod TestClient, aiosqlite pod tryb async, redis + fakeredis pod test_todo_cache)
+import os
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main
+
+
+@pytest.fixture(params=["sqlite", "sqlite+aiosqlite"])
+def database_url(request, tmp_path):
+    return f"{request.param}:///{tmp_path / 'todos.db'}"
+
+
+@pytest.fixture
+def app_state(database_url, monkeypatch):
+    # stan modułu, który init_db() i cache ustawiają przy starcie - po teście wraca do stanu sprzed
+    monkeypatch.setattr(main, "SQLALCHEMY_DATABASE_URL", database_url)
+    monkeypatch.setattr(main, "DB_CREATE_SCHEMA", True)
+    for name in ("engine", "SessionLocal", "read_engine", "ReadSessionLocal", "ASYNC_DB", "PG_NOTIFY"):
+        monkeypatch.setattr(main, name, getattr(main, name))
+    monkeypatch.setattr(main, "engine", None)
+    monkeypatch.setattr(main, "todo_cache", main.MemoryTodoCache(main.TODO_CACHE_SIZE, main.TODO_CACHE_TTL))
+    monkeypatch.setattr(main, "_stats_cache", {"value": None, "expires": 0.0})
+    return monkeypatch
+
+
+@pytest.fixture
+def client(app_state):
+    with TestClient(main.app) as test_client:
+        yield test_client
+
+
+def run_db(client, fn, *args):
+    # zapytanie na własnej sesji, w pętli zdarzeń aplikacji (potrzebne w trybie async)
+    async def call():
+        db = main.SessionLocal()
+        try:
+            return await main.run_db(db, fn, *args)
+        finally:
+            await main.close_db(db)
+
+    return client.portal.call(call)
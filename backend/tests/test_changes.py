@@ -0,0 +1,76 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+import main
+from conftest import run_db
+
+
+def all_changes(client, since, limit):
+    changed, deleted, pages = {}, [], 0
+    while True:
+        response = client.get(f"/todos/changes?since={since}&limit={limit}")
+        assert response.status_code == 200
+        data = response.json()
+        changed.update({todo["id"]: todo for todo in data["changed"]})
+        deleted += data["deleted"]
+        since = data["cursor"]
+        pages += 1
+        if not data["has_more"]:
+            return changed, deleted, since, pages
+
+
+def test_changes_pages_through_updates_and_tombstones(client):
+    old = client.post("/todos/batch", json={"items": [{"title": f"old {i}"} for i in range(3)]}).json()
+    head = client.get("/todos/changes").json()["cursor"]
+
+    created = client.post("/todos/batch", json={"items": [{"title": f"new {i}"} for i in range(5)]}).json()
+    client.put(f"/todos/{old[0]['id']}", json={"completed": True})
+    client.delete(f"/todos/{old[1]['id']}")
+    client.request("DELETE", "/todos/batch", json={"ids": [created[0]["id"], created[1]["id"]]})
+
+    changed, deleted, cursor, pages = all_changes(client, head, limit=2)
+    assert pages > 1
+    assert set(changed) == {old[0]["id"]} | {todo["id"] for todo in created[2:]}
+    assert changed[old[0]["id"]]["completed"] is True
+    assert sorted(deleted) == sorted([old[1]["id"], created[0]["id"], created[1]["id"]])
+
+    # od ostatniego kursora nic nowego
+    assert all_changes(client, cursor, limit=2)[:2] == ({}, [])
+
+
+def test_change_seq_follows_writes(client):
+    first, second = client.post("/todos/batch", json={"items": [{"title": "a"}, {"title": "b"}]}).json()
+    client.put(f"/todos/{first['id']}", json={"title": "a2"})
+    seqs = dict(run_db(client, lambda db: db.execute(select(main.TodoDB.id, main.TodoDB.change_seq)).all()))
+    # przepisany wiersz dostaje numer większy niż wszystkie wcześniejsze
+    assert seqs[first["id"]] > seqs[second["id"]]
+
+
+def test_changes_rejects_invalid_and_expired_cursors(client):
+    assert client.get("/todos/changes?since=nonsense").status_code == 400
+    issued_at = datetime.utcnow() - timedelta(days=main.TOMBSTONE_RETENTION_DAYS + 1)
+    expired = main._b64encode(f"||||{issued_at.isoformat()}")
+    assert client.get(f"/todos/changes?since={expired}").status_code == 410
+
+
+def test_prune_tombstones_keeps_recent_ones(client):
+    todos = client.post("/todos/batch", json={"items": [{"title": f"t{i}"} for i in range(5)]}).json()
+    client.request("DELETE", "/todos/batch", json={"ids": [todo["id"] for todo in todos]})
+    old_ids = [todo["id"] for todo in todos[:3]]
+
+    def age_tombstones(db):
+        db.execute(
+            update(main.TombstoneDB)
+            .where(main.TombstoneDB.todo_id.in_(old_ids))
+            .values(deleted_at=datetime.utcnow() - timedelta(days=30))
+        )
+        db.commit()
+
+    run_db(client, age_tombstones)
+    cutoff = datetime.utcnow() - timedelta(days=main.TOMBSTONE_RETENTION_DAYS)
+    assert run_db(client, main.prune_tombstones, cutoff, 2) == 2
+    assert run_db(client, main.prune_tombstones, cutoff, 2) == 1
+    assert run_db(client, main.prune_tombstones, cutoff, 2) == 0
+    left = run_db(client, lambda db: db.scalars(select(main.TombstoneDB.todo_id)).all())
+    assert sorted(left) == [todo["id"] for todo in todos[3:]]
@@ -0,0 +1,75 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+
+
+@pytest.fixture
+def client(app_state):
+    # długie okno paczki, żeby równoległe PUT-y trafiły do jednej
+    app_state.setattr(main, "update_coalescer", main.UpdateCoalescer(0.2, 200, 4))
+    batches = []
+    grouped = main.update_todo_rows_grouped
+
+    def record(db, updates):
+        batches.append([todo_id for todo_id, _ in updates])
+        return grouped(db, updates)
+
+    app_state.setattr(main, "update_todo_rows_grouped", record)
+    with TestClient(main.app, raise_server_exceptions=False) as test_client:
+        test_client.batches = batches
+        yield test_client
+
+
+def put_all(client, requests):
+    with ThreadPoolExecutor(len(requests)) as pool:
+        return list(pool.map(lambda request: client.put(f"/todos/{request[0]}", json=request[1]), requests))
+
+
+def test_batched_updates_return_their_own_rows(client):
+    todos = client.post("/todos/batch", json={"items": [{"title": f"t{i}"} for i in range(3)]}).json()
+    missing = max(todo["id"] for todo in todos) + 100
+    requests = [
+        (todos[0]["id"], {"completed": True}),
+        (todos[1]["id"], {"title": "renamed"}),
+        (todos[2]["id"], {"title": "both", "completed": True}),
+        (missing, {"completed": True}),
+    ]
+
+    responses = put_all(client, requests)
+
+    # jedna paczka (jedno UPDATE) na cztery żądania
+    assert [sorted(batch) for batch in client.batches] == [sorted(todo_id for todo_id, _ in requests)]
+    assert [response.status_code for response in responses] == [200, 200, 200, 404]
+    first, second, third = (response.json() for response in responses[:3])
+    assert (first["id"], first["title"], first["completed"]) == (todos[0]["id"], "t0", True)
+    assert (second["id"], second["title"], second["completed"]) == (todos[1]["id"], "renamed", False)
+    assert (third["id"], third["title"], third["completed"]) == (todos[2]["id"], "both", True)
+
+
+def test_failing_update_only_fails_its_request(client):
+    todos = client.post("/todos/batch", json={"items": [{"title": f"t{i}"} for i in range(3)]}).json()
+    requests = [
+        (todos[0]["id"], {"completed": True}),
+        (todos[1]["id"], {"title": None}),  # NOT NULL - wywraca całe UPDATE paczki
+        (todos[2]["id"], {"title": "ok"}),
+    ]
+
+    responses = put_all(client, requests)
+
+    assert [response.status_code for response in responses] == [200, 500, 200]
+    assert client.get(f"/todos/{todos[0]['id']}").json()["completed"] is True
+    assert client.get(f"/todos/{todos[1]['id']}").json()["title"] == "t1"
+    assert client.get(f"/todos/{todos[2]['id']}").json()["title"] == "ok"
+
+
+def test_updates_of_one_todo_apply_in_order(client):
+    todo = client.post("/todos", json={"title": "t"}).json()
+    responses = put_all(client, [(todo["id"], {"title": f"v{i}"}) for i in range(3)])
+
+    # zapisy jednego todo idą w osobnych paczkach, każde żądanie widzi stan po swoim zapisie
+    assert all(len(batch) == 1 for batch in client.batches)
+    assert sorted(response.json()["title"] for response in responses) == ["v0", "v1", "v2"]
+    assert client.get(f"/todos/{todo['id']}").json()["title"] in {"v0", "v1", "v2"}
@@ -0,0 +1,26 @@
+from sqlalchemy import func, select
+
+import main
+from conftest import run_db
+
+
+def count_todos(client):
+    return run_db(client, lambda db: db.scalar(select(func.count()).select_from(main.TodoDB)))
+
+
+def test_retried_post_returns_the_same_todo(client):
+    headers = {"Idempotency-Key": "retry-1"}
+    first = client.post("/todos", json={"title": "buy milk"}, headers=headers)
+    # ponowienie po zgubionej odpowiedzi - może mieć nawet inny tytuł, liczy się klucz
+    second = client.post("/todos", json={"title": "buy milk!"}, headers=headers)
+
+    assert first.status_code == second.status_code == 200
+    assert second.json() == first.json()
+    assert first.json()["client_key"] == "retry-1"
+    assert count_todos(client) == 1
+
+
+def test_posts_without_key_are_not_deduplicated(client):
+    client.post("/todos", json={"title": "same"})
+    client.post("/todos", json={"title": "same"})
+    assert count_todos(client) == 2
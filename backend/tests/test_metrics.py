@@ -0,0 +1,20 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+import main
+from conftest import run_db
+
+
+def test_failed_query_is_counted_and_timer_cleared(client):
+    errors = main.DB_QUERY_ERRORS.labels("none")
+    before = errors._value.get()
+
+    def fail(db):
+        with pytest.raises(OperationalError):
+            db.execute(text("SELECT * FROM no_such_table"))
+        # ten sam Connection - start nieudanego zapytania nie może na nim zostać
+        return list(db.connection().info.get("query_start", []))
+
+    assert run_db(client, fail) == []
+    assert errors._value.get() == before + 1
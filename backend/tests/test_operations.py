@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select, update
+
+import main
+from conftest import run_db
+
+
+def count_todos(client):
+    return run_db(client, lambda db: db.scalar(select(func.count()).select_from(main.TodoDB)))
+
+
+def send(client, operations):
+    response = client.post("/todos/operations", json={"items": operations})
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_replayed_batch_gives_the_same_results(client):
+    operations = [
+        {"key": "c1", "op": "create", "title": "offline"},
+        {"key": "u1", "op": "update", "ref": "c1", "completed": True},
+        {"key": "c2", "op": "create", "title": "gone"},
+        {"key": "d1", "op": "delete", "ref": "c2"},
+    ]
+    first = send(client, operations)
+    # odpowiedź zginęła - klient wysyła tę samą paczkę jeszcze raz
+    second = send(client, operations)
+
+    assert [result["status"] for result in first] == ["ok"] * 4
+    assert [result["status"] for result in second] == ["ok", "ok", "missing", "ok"]
+    assert second[0]["todo"]["id"] == first[0]["todo"]["id"]
+    assert second[1]["todo"] == first[1]["todo"]
+    assert count_todos(client) == 1
+
+
+def test_replayed_update_does_not_overwrite_newer_change(client):
+    todo = client.post("/todos", json={"title": "t"}).json()
+    operations = [{"key": "u1", "op": "update", "id": todo["id"], "title": "from log"}]
+    send(client, operations)
+    client.put(f"/todos/{todo['id']}", json={"title": "newer"})
+
+    result, = send(client, operations)
+
+    assert result["status"] == "ok"
+    assert result["todo"]["title"] == "newer"
+    assert client.get(f"/todos/{todo['id']}").json()["title"] == "newer"
+
+
+def test_replayed_update_of_deleted_todo_is_missing(client):
+    todo = client.post("/todos", json={"title": "t"}).json()
+    operations = [{"key": "u1", "op": "update", "id": todo["id"], "completed": True}]
+    send(client, operations)
+    client.delete(f"/todos/{todo['id']}")
+
+    assert send(client, operations)[0]["status"] == "missing"
+
+
+def test_prune_applied_operations(client):
+    send(client, [{"key": f"c{i}", "op": "create", "title": f"t{i}"} for i in range(3)])
+
+    def age(db):
+        db.execute(
+            update(main.AppliedOperationDB)
+            .where(main.AppliedOperationDB.key.in_(["c0", "c1"]))
+            .values(applied_at=datetime.utcnow() - timedelta(days=30))
+        )
+        db.commit()
+
+    run_db(client, age)
+    cutoff = datetime.utcnow() - timedelta(days=main.TOMBSTONE_RETENTION_DAYS)
+    assert run_db(client, main.prune_applied_operations, cutoff, 10) == 2
+    left = run_db(client, lambda db: db.scalars(select(main.AppliedOperationDB.key)).all())
+    assert left == ["c2"]
+
+
+def test_clear_completed_runs_in_log_order(client):
+    todos = client.post("/todos/batch", json={"items": [{"title": f"t{i}"} for i in range(3)]}).json()
+    client.put(f"/todos/{todos[0]['id']}", json={"completed": True})
+    operations = [
+        # zmiany sprzed kliknięcia idą przed clear_completed
+        {"key": "u1", "op": "update", "id": todos[1]["id"], "completed": True},
+        {"key": "u2", "op": "update", "id": todos[0]["id"], "completed": False},
+        {"key": "clear", "op": "clear_completed"},
+    ]
+    results = send(client, operations)
+
+    assert [result["status"] for result in results] == ["ok", "ok", "ok"]
+    left = sorted(todo["id"] for todo in client.get("/todos").json()["items"])
+    assert left == sorted([todos[0]["id"], todos[2]["id"]])
+
+    # powtórka nie kasuje zadań oznaczonych jako wykonane już po niej
+    client.put(f"/todos/{todos[2]['id']}", json={"completed": True})
+    assert send(client, operations)[2]["status"] == "ok"
+    assert client.get(f"/todos/{todos[2]['id']}").status_code == 200
@@ -0,0 +1,66 @@
+import asyncio
+
+import fakeredis.aioredis
+
+import main
+
+
+def redis_cache():
+    cache = main.RedisTodoCache("redis://localhost", ttl=60, fill_ttl=5)
+    cache.client = fakeredis.aioredis.FakeRedis()
+    return cache
+
+
+def test_redis_fill_does_not_overwrite_write():
+    async def scenario():
+        cache = redis_cache()
+        # zapis z innego workera zdążył przed wypełnieniem starym odczytem
+        await cache.set(1, {"id": 1, "title": "new"})
+        await cache.fill(1, {"id": 1, "title": "old"})
+        assert await cache.get(1) == {"id": 1, "title": "new"}
+        assert await cache.client.pttl(cache.key(1)) > 5000
+
+    asyncio.run(scenario())
+
+
+def test_redis_fill_is_short_lived_and_skips_deleted():
+    async def scenario():
+        cache = redis_cache()
+        await cache.fill(1, {"id": 1, "title": "read"})
+        assert await cache.get(1) == {"id": 1, "title": "read"}
+        assert 0 < await cache.client.pttl(cache.key(1)) <= 5000
+
+        await cache.delete([1])
+        await cache.fill(1, {"id": 1, "title": "read"})
+        assert await cache.get(1) is None
+
+    asyncio.run(scenario())
+
+
+def test_notification_updates_memory_cache_before_version(monkeypatch):
+    cache = main.MemoryTodoCache(10, 60)
+    monkeypatch.setattr(main, "todo_cache", cache)
+    seen = []
+    monkeypatch.setattr(main, "todos_changed", lambda: seen.append(cache.items.get(1)))
+    cache.apply({"changed": [{"id": 1, "title": "old"}], "deleted": []})
+
+    main.handle_notification(main.json.dumps({"changed": [{"id": 1, "title": "new"}], "deleted": []}))
+
+    # wersja podbita dopiero przy nowej treści w cache, bez czekania na pętlę zdarzeń
+    assert seen[0][1]["title"] == "new"
+
+
+def test_publish_changes_updates_cache_before_version(client, monkeypatch):
+    todo = client.post("/todos", json={"title": "old"}).json()
+    assert client.get(f"/todos/{todo['id']}").json()["title"] == "old"
+    seen = []
+    todos_changed = main.todos_changed
+
+    def record():
+        seen.append(main.todo_cache.items.get(todo["id"]))
+        todos_changed()
+
+    monkeypatch.setattr(main, "todos_changed", record)
+    client.put(f"/todos/{todo['id']}", json={"title": "new"})
+
+    assert seen[-1][1]["title"] == "new"
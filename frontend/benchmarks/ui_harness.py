@@ -0,0 +1,335 @@
+# Pomiar frontendu bez przeglądarki i bez prawdziwego backendu.
+#
+# Uruchomienie (z katalogu frontend):
+#   python benchmarks/ui_harness.py
+# TodoApp i Task działają tu na prawdziwej stronie Flet, której połączenie (FakeConnection)
+# nic nie wysyła, tylko liczy komendy i bajty, jakie poszłyby do przeglądarki. Backend to
+# FakeBackend - serwer HTTP w tym samym procesie z listą todo w pamięci i opóźnieniem
+# BENCH_LATENCY_MS na każde żądanie. Dla każdego N z BENCH_TASKS mierzy:
+#   - pierwszą stronę listy (start aplikacji) i dociągnięcie całej listy strona po stronie,
+#   - zbudowanie N zadań (reconcile_tasks) i wysłanie ich do przeglądarki,
+#   - koszt odświeżenia całej listy i jednego zadania (ms i bajty),
+#   - serię przełączeń checkboxów i "Clear completed": ile żądań HTTP, ile czasu,
+#   - liczbę wątków w procesie.
+# Każde N liczy się w osobnym procesie (ten sam skrypt z N w argumencie), żeby wątki, liczniki
+# ApiClient.metrics i monitor backendu z poprzedniego pomiaru nie mieszały się z kolejnym.
+# Wyniki: tabela na stdout i JSON w BENCH_OUTPUT (domyślnie ui_harness.json).
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import flet as ft
+from flet.core.local_connection import LocalConnection
+from flet.core.protocol import CommandEncoder, PageCommandResponsePayload, PageCommandsBatchResponsePayload
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import main
+
+TASKS = [int(n) for n in os.getenv("BENCH_TASKS", "100,1000,10000").split(",")]
+LATENCY = float(os.getenv("BENCH_LATENCY_MS", "50")) / 1000
+OUTPUT = os.getenv("BENCH_OUTPUT", "ui_harness.json")
+TOGGLES = 100
+TIMEOUT = 120
+
+
+class FakeBackend:
+    # endpointy, których używa frontend, na liście w pamięci; każde żądanie czeka LATENCY
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.requests = Counter()  # "METODA /ścieżka" -> liczba żądań
+        self.next_id = 1
+        self.todos = {}
+        start = datetime.utcnow() - timedelta(seconds=size)
+        for i in range(size):
+            self.create(f"harness task {i}", random.random() < 0.4, start + timedelta(seconds=i))
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                backend.handle(self, "GET")
+
+            def do_POST(self):
+                backend.handle(self, "POST")
+
+            def do_PUT(self):
+                backend.handle(self, "PUT")
+
+            def do_DELETE(self):
+                backend.handle(self, "DELETE")
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def create(self, title, completed=False, created_at=None, client_key=None):
+        created_at = (created_at or datetime.utcnow()).isoformat()
+        todo = {
+            "id": self.next_id, "title": title, "completed": completed,
+            "created_at": created_at, "updated_at": created_at, "client_key": client_key,
+        }
+        self.todos[todo["id"]] = todo
+        self.next_id += 1
+        return todo
+
+    def total_requests(self) -> int:
+        with self.lock:
+            return sum(self.requests.values())
+
+    def handle(self, handler, method):
+        url = urlparse(handler.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = None
+        if int(handler.headers.get("Content-Length") or 0):
+            body = json.loads(handler.rfile.read(int(handler.headers["Content-Length"])))
+        path = url.path
+        label = "/todos/{id}" if path.startswith("/todos/") and path[len("/todos/"):].isdigit() else path
+        with self.lock:
+            self.requests[f"{method} {label}"] += 1
+        if path == "/todos/events":
+            return self.events(handler)
+        time.sleep(LATENCY)
+        with self.lock:
+            status, data = self.route(method, path, query, body)
+        payload = json.dumps(data).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+    def events(self, handler):
+        # strumień SSE z samym heartbeatem, jak backend bez zmian
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.end_headers()
+        try:
+            while True:
+                handler.wfile.write(b"event: heartbeat\ndata: {}\n\n")
+                handler.wfile.flush()
+                time.sleep(10)
+        except OSError:
+            pass
+
+    def route(self, method, path, query, body):
+        if method == "GET" and path == "/todos":
+            todos = sorted(self.todos.values(), key=lambda t: (t["created_at"], t["id"]), reverse=True)
+            if "completed" in query:
+                todos = [todo for todo in todos if todo["completed"] == (query["completed"] == "true")]
+            offset = int(query.get("after", 0))
+            limit = int(query.get("limit", 50))
+            end = offset + limit
+            return 200, {"items": todos[offset:end], "next_cursor": str(end) if end < len(todos) else None}
+        if method == "GET" and path == "/todos/changes":
+            return 200, {"changed": [], "deleted": [], "cursor": "0", "has_more": False}
+        if method == "GET" and path == "/todos/stats/summary":
+            completed = sum(todo["completed"] for todo in self.todos.values())
+            return 200, {"total": len(self.todos), "completed": completed, "active": len(self.todos) - completed}
+        if method == "GET" and path == "/todos/search":
+            found = [todo for todo in self.todos.values() if query["q"].lower() in todo["title"].lower()]
+            return 200, found[:50]
+        if method == "DELETE" and path == "/todos":
+            deleted = [todo_id for todo_id, todo in self.todos.items() if todo["completed"]]
+            for todo_id in deleted:
+                del self.todos[todo_id]
+            return 200, {"deleted": len(deleted)}
+        if method == "POST" and path == "/todos/operations":
+            return 200, [self.apply(operation) for operation in body["items"]]
+        return 404, {"detail": "Not found"}
+
+    def apply(self, operation):
+        # jak POST /todos/operations w backendzie, bez kluczy idempotencji
+        if operation["op"] == "create":
+            todo = self.create(operation["title"], client_key=operation["key"])
+            return {"key": operation["key"], "status": "ok", "todo": todo}
+        if operation["op"] == "clear_completed":
+            for todo_id in [todo_id for todo_id, todo in self.todos.items() if todo["completed"]]:
+                del self.todos[todo_id]
+            return {"key": operation["key"], "status": "ok", "todo": None}
+        todo_id = operation["id"]
+        if todo_id is None:
+            todo_id = next((t["id"] for t in self.todos.values() if t["client_key"] == operation["ref"]), None)
+        if todo_id not in self.todos:
+            return {"key": operation["key"], "status": "missing", "todo": None}
+        if operation["op"] == "delete":
+            del self.todos[todo_id]
+            return {"key": operation["key"], "status": "ok", "todo": None}
+        todo = self.todos[todo_id]
+        todo.update({field: operation[field] for field in ("title", "completed") if field in operation})
+        todo["updated_at"] = datetime.utcnow().isoformat()
+        return {"key": operation["key"], "status": "ok", "todo": todo}
+
+
+class FakeConnection(LocalConnection):
+    # połączenie strony Flet bez przeglądarki: komendy przechodzą przez to samo przetwarzanie
+    # co w serwerze Flet (nadawanie id kontrolkom), ale zamiast wysyłać liczymy je i ich bajty
+
+    def __init__(self):
+        super().__init__()
+        self.batches = 0
+        self.bytes = 0
+
+    def send_command(self, session_id, command):
+        result, _ = self._process_command(command)
+        return PageCommandResponsePayload(result=result, error="")
+
+    def send_commands(self, session_id, commands):
+        results, messages = [], []
+        for command in commands:
+            result, message = self._process_command(command)
+            if command.name in ("add", "get"):
+                results.append(result)
+            if message:
+                messages.append(message)
+        self.batches += 1
+        self.bytes += len(json.dumps(messages, cls=CommandEncoder, separators=(",", ":")))
+        return PageCommandsBatchResponsePayload(results=results, error="")
+
+
+def wait_until(condition, timeout=TIMEOUT):
+    deadline = time.perf_counter() + timeout
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("harness condition not met")
+        time.sleep(0.001)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def measure_update(connection, page, *controls):
+    # ms i bajty jednego page.update tych kontrolek
+    connection.bytes = 0
+    ms = timed(lambda: page.update(*controls))
+    return {"ms": ms, "bytes": connection.bytes}
+
+
+def operations_sent(app):
+    return not app.store.unsent and not app.store.sending
+
+
+def run(size):
+    backend = FakeBackend(size)
+    main.BACKEND_URL = backend.url
+    store_dir = tempfile.mkdtemp(prefix="todo-harness-")
+    main.LOCAL_STORE_PATH = os.path.join(store_dir, "store.db")
+    connection = FakeConnection()
+    page = ft.Page(connection, f"harness-{size}", asyncio.new_event_loop())
+    threads_before = threading.active_count()
+    result = {"tasks": size, "latency_ms": LATENCY * 1000}
+    try:
+        # start: pusta lokalna kopia, pierwsza strona z backendu
+        start = time.perf_counter()
+        app = main.TodoApp(page)
+        page.add(app)
+        wait_until(lambda: app.changes_cursor is not None and app.active_count is not None)
+        result["first_page_ms"] = (time.perf_counter() - start) * 1000
+
+        # przewijanie do końca - wszystkie zadania z zakładki, strona po stronie
+        start = time.perf_counter()
+        while app.next_cursor:
+            app.load_next_page()
+            wait_until(lambda: not app.loading_page)
+        result["all_pages_ms"] = (time.perf_counter() - start) * 1000
+        result["loaded_tasks"] = len(app.tasks.controls)
+
+        # budowa listy N zadań od zera i wysłanie jej do przeglądarki
+        todos = sorted(backend.todos.values(), key=lambda t: (t["created_at"], t["id"]), reverse=True)
+        app.tasks.controls.clear()
+        page.update(app.tasks)
+        result["list_build_ms"] = timed(lambda: app.reconcile_tasks(todos))
+        result["list_send"] = measure_update(connection, page, app.tasks)
+        # ponowne wczytanie tych samych danych - nic się nie zmienia
+        result["list_reconcile_ms"] = timed(lambda: app.reconcile_tasks(todos))
+        result["list_update"] = measure_update(connection, page, app.tasks)
+        result["task_update"] = measure_update(connection, page, app.tasks.controls[0])
+
+        # seria przełączeń checkboxów: ile żądań i czasu do potwierdzenia przez backend
+        requests_before = backend.total_requests()
+        batches_before = connection.batches
+        tasks = random.sample(app.tasks.controls, min(TOGGLES, len(app.tasks.controls)))
+        start = time.perf_counter()
+        for task in tasks:
+            task.display_task.value = not task.completed
+            task.status_changed(None)
+        for task in tasks:
+            task.updates.flush()
+        wait_until(lambda: operations_sent(app))
+        result["toggles"] = {
+            "count": len(tasks),
+            "ms": (time.perf_counter() - start) * 1000,
+            "requests": backend.total_requests() - requests_before,
+            "ui_updates": connection.batches - batches_before,
+        }
+
+        # "Clear completed"
+        requests_before = backend.total_requests()
+        start = time.perf_counter()
+        app.clear_clicked(None)
+        wait_until(lambda: not any(todo["completed"] for todo in backend.todos.values()) and operations_sent(app))
+        result["clear_completed"] = {
+            "ms": (time.perf_counter() - start) * 1000,
+            "requests": backend.total_requests() - requests_before,
+        }
+
+        result["threads"] = threading.active_count() - threads_before
+        result["requests"] = dict(backend.requests)
+        result["client_metrics"] = main.ApiClient.metrics.snapshot()
+    finally:
+        backend.close()
+        shutil.rmtree(store_dir, ignore_errors=True)
+    return result
+
+
+def main_bench():
+    results = []
+    print(
+        f"{'tasks':>7} {'1st page':>9} {'all pages':>10} {'build ms':>9} {'send ms':>8} {'send KB':>8} "
+        f"{'list upd':>9} {'task upd':>9} {'toggle req':>11} {'clear req':>10} {'threads':>8}"
+    )
+    for size in TASKS:
+        process = subprocess.run([sys.executable, __file__, str(size)], capture_output=True, text=True, check=True)
+        result = json.loads(process.stdout.splitlines()[-1])
+        results.append(result)
+        print(
+            f"{size:>7} {result['first_page_ms']:>9.0f} {result['all_pages_ms']:>10.0f} "
+            f"{result['list_build_ms']:>9.1f} {result['list_send']['ms']:>8.1f} "
+            f"{result['list_send']['bytes'] / 1024:>8.0f} {result['list_update']['ms']:>9.2f} "
+            f"{result['task_update']['ms']:>9.3f} {result['toggles']['requests']:>11} "
+            f"{result['clear_completed']['requests']:>10} {result['threads']:>8}"
+        )
+    with open(OUTPUT, "w") as f:
+        json.dump({"timestamp": datetime.utcnow().isoformat(), "results": results}, f, indent=2)
+    print(f"results written to {OUTPUT}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        print(json.dumps(run(int(sys.argv[1]))))
+    else:
+        main_bench()
@@ -1,22 +1,227 @@
 import flet as ft
 import requests
 import threading
-import time
 import os
+import json
+import time
+import uuid
+import sqlite3
+import traceback
+import weakref
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
+
+# MessagePack jest opcjonalny - bez niego prosimy backend o kolumnowy JSON
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 
 # URL backendu z ustawień środowiskowych lub domyślnie localhost
 BACKEND_URL = os.getenv("BACKEND_URL", "https://inz-pypv.onrender.com")
 
+# ile zadań pobieramy w jednym zapytaniu GET /todos; kolejne strony dociągamy przy przewijaniu,
+# gdy do końca listy zostało mniej niż LOAD_MORE_THRESHOLD pikseli
+TODOS_PAGE_SIZE = 100
+LOAD_MORE_THRESHOLD = 600
+
+# ile sekund po ostatnim naciśnięciu klawisza wysyłamy wyszukiwanie
+SEARCH_DEBOUNCE_SECONDS = 0.3
+
+# zwarty format list (GET /todos, /todos/changes); inne endpointy odpowiadają zwykłym JSON.
+# gzip requests negocjuje sam (Accept-Encoding) i sam rozpakowuje odpowiedź
+COLUMNS_MEDIA_TYPE = "application/vnd.todos.columns+json"
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+ACCEPT_HEADER = f"{MSGPACK_MEDIA_TYPE if msgpack else COLUMNS_MEDIA_TYPE}, application/json;q=0.9"
+
+# ile sekund po ostatniej zmianie zadania (checkbox, nazwa) wysyłamy PUT - szybkie
+# przełączanie checkboxa kończy się jednym zapytaniem z ostatnim stanem
+UPDATE_DEBOUNCE_SECONDS = 0.25
+
+# odświeżenia UI z wątków w tle wysyłamy razem, najwyżej raz na tyle sekund (~30 klatek/s)
+UI_FRAME_SECONDS = 1 / 30
+
+# jak nie wiemy, jak zdarzenie zmieniło licznik aktywnych (zadanie spoza załadowanej listy),
+# pytamy backend o statystyki, ale najwyżej raz na tyle sekund
+STATS_REFRESH_SECONDS = 1.0
+
+# wspólna sesja HTTP: ile połączeń naraz do backendu (keep-alive, reszta czeka na wolne)
+# i ile wątków wysyła zapytania w tle - kliknięcia ponad to czekają w kolejce
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "4"))
+HTTP_WORKERS = int(os.getenv("HTTP_WORKERS", "4"))
+# ponowienia przy zerwanym połączeniu i 502/503/504 (np. budzący się backend na Render);
+# odstępy rosną wykładniczo z losowym rozrzutem, żeby klienci nie wracali wszyscy naraz
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_BACKOFF_JITTER = 0.5
+# ile ostatnich odpowiedzi GET trzymamy pod ETag - URL-e z kursorem, wyszukiwaniem itp. są
+# jednorazowe, więc bez limitu cache rósłby z każdą stroną i każdym zapytaniem
+ETAG_CACHE_SIZE = 64
+
+# lokalna kopia zadań i dziennik operacji do backendu (SQLite) - lista jest od razu na starcie,
+# a zmiany zrobione bez backendu czekają w dzienniku i idą po powrocie paczkami po OPERATIONS_BATCH_SIZE.
+# Jedna na proces (LocalStore.shared): w trybie web wszystkie sesje przeglądarki żyją w procesie
+# serwera Flet, więc dzielą kopię i dziennik, a "offline" znaczy, że serwer Flet nie widzi backendu
+LOCAL_STORE_PATH = os.getenv("LOCAL_STORE_PATH", os.path.join(os.path.expanduser("~"), ".todo_local.db"))
+OPERATIONS_BATCH_SIZE = 100
+
+# backend wysyła heartbeat co 10 s - jak przez tyle sekund nic nie przyjdzie, uznajemy że padł
+EVENTS_READ_TIMEOUT = 30
+
+
+def make_session() -> requests.Session:
+    # POST nie jest ponawiany (urllib3 ponawia tylko metody idempotentne), żeby nie dublować zadań
+    retry = Retry(
+        total=HTTP_RETRIES,
+        backoff_factor=HTTP_BACKOFF,
+        backoff_jitter=HTTP_BACKOFF_JITTER,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, pool_block=True, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+class RequestMetrics:
+    # liczniki zapytań do backendu: ile leci teraz, ile zadań czeka w kolejce wątków, ile było w sumie
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.queued = 0
+        self.total = 0
+        self.errors = 0
+
+    def request_started(self):
+        with self.lock:
+            self.in_flight += 1
+            self.total += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def request_finished(self, error):
+        with self.lock:
+            self.in_flight -= 1
+            if error:
+                self.errors += 1
+
+    def task_queued(self):
+        with self.lock:
+            self.queued += 1
+
+    def task_started(self):
+        with self.lock:
+            self.queued -= 1
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "in_flight": self.in_flight,
+                "max_in_flight": self.max_in_flight,
+                "queued": self.queued,
+                "total": self.total,
+                "errors": self.errors,
+            }
+
+
+class Debouncer:
+    # jeden wątek dla wszystkich opóźnionych akcji (wyszukiwanie, zmiany zadań) - kolejne
+    # schedule() z tym samym kluczem przesuwa termin zamiast tworzyć nowy timer;
+    # akcje mają być krótkie (np. ApiClient.submit), bo wszystkie idą po kolei w tym wątku
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.deadlines = {}  # klucz -> (kiedy, funkcja)
+        self.thread = None
+
+    def schedule(self, key, delay, fn):
+        with self.condition:
+            self.deadlines[key] = (time.monotonic() + delay, fn)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+            self.condition.notify()
+
+    def cancel(self, key):
+        with self.condition:
+            self.deadlines.pop(key, None)
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while True:
+                    now = time.monotonic()
+                    due = [key for key, (when, _) in self.deadlines.items() if when <= now]
+                    if due:
+                        break
+                    timeout = min((when for when, _ in self.deadlines.values()), default=None)
+                    self.condition.wait(None if timeout is None else timeout - now)
+                actions = [self.deadlines.pop(key)[1] for key in due]
+            for fn in actions:
+                try:
+                    fn()
+                except Exception:
+                    traceback.print_exc()
+
+
+debouncer = Debouncer()
+
+
+class UpdateScheduler:
+    # kontrolki do odświeżenia zaznaczamy (mark), a wysyłamy je do przeglądarki razem, jednym
+    # page.update, najwyżej raz na klatkę - dziesięć zmian z wątków w tle to jedno odświeżenie,
+    # i tylko zmienionych kontrolek zamiast całej aplikacji
+
+    def __init__(self, page, state_lock=None):
+        self.page = page
+        self.lock = threading.Lock()
+        self.dirty = {}  # id(kontrolki) -> kontrolka
+        self.scheduled = False
+        # blokada stanu aplikacji - lista nie może się zmieniać w trakcie jej wysyłania
+        self.state_lock = state_lock or threading.RLock()
+
+    def mark(self, *controls):
+        with self.lock:
+            for control in controls:
+                self.dirty[id(control)] = control
+            if self.scheduled:
+                return
+            self.scheduled = True
+        debouncer.schedule(self, UI_FRAME_SECONDS, self.flush)
+
+    def flush(self):
+        with self.lock:
+            controls, self.dirty = list(self.dirty.values()), {}
+            self.scheduled = False
+        # dzieci zaznaczonej kontrolki (np. zadania w odświeżanej liście) idą razem z nią
+        nested = {id(child) for control in controls for child in getattr(control, "controls", ())}
+        controls = [control for control in controls if id(control) not in nested and control.page]
+        if self.page and controls:
+            with self.state_lock:
+                self.page.update(*controls)
+
 
 class BackendMonitor:
-    # klasa która sprawdza czy backend działa - co chwilę wysyła zapytanie /health
+    # klasa która sprawdza czy backend działa - trzyma otwarty strumień /todos/events,
+    # a heartbeat z niego jest sygnałem że backend żyje
 
     def __init__(self, app_ref):
         self.app_ref = app_ref  # referencja do głównej aplikacji żeby aktualizować UI
         self.is_online = False  # czy backend jest online
         self.monitoring = False  # czy monitorowanie jest aktywne
         self.retry_count = 0  # ile razy próbowalem sie poolaczyc
+        self.wake_up = threading.Event()  # przerywa czekanie między próbami (przycisk Retry)
+        # osobna sesja na strumień zdarzeń - trzyma połączenie cały czas, więc nie zajmuje
+        # miejsca w puli zwykłych zapytań; ponawia sama pętla monitorowania
+        self.session = requests.Session()
 
     def start_monitoring(self):
         # uruchamiamy osobny wątek sprawdzajacy backend
@@ -24,80 +229,429 @@ class BackendMonitor:
             self.monitoring = True
             threading.Thread(target=self._monitor_loop, daemon=True).start()
 
+    def stop_monitoring(self):
+        # sesja zamknięta - pętla kończy się przy następnym zdarzeniu/heartbeacie albo od razu,
+        # jeśli czeka na ponowienie
+        self.monitoring = False
+        self.wake_up.set()
+
     def _monitor_loop(self):
-        # pętla która co chwilę sprawdza backend 
+        # pętla która trzyma połączenie ze strumieniem zdarzeń, a jak się zerwie to łączy od nowa
         while self.monitoring:
-            was_online = self.is_online
-            self.check_backend_health()
-            # jeśli cos wywalilo, a teraz jest połączenie
-            if not was_online and self.is_online:
-                self.app_ref.on_backend_reconnected()  # powiadamiamy appkę
-                self.retry_count = 0  # resetujemy licznik prób
-            # czas czekania między próbami zależny od stanu (backoff)
-            sleep_time = 5 if self.is_online else min(2 ** self.retry_count, 30)
-            if not self.is_online:
+            try:
+                self._listen_events()
+            except Exception:
+                pass
+            # strumień się skończył albo nie dało się połączyć - backend offline
+            self.is_online = False
+            status = f"Backend offline (Retry {self.retry_count})" if self.retry_count > 0 else "Backend offline"
+            self.app_ref.update_connection_status(status, ft.Colors.RED)
+            # czas czekania między próbami (backoff), Retry budzi pętlę wcześniej
+            if not self.wake_up.wait(min(2 ** self.retry_count, 30)):
                 self.retry_count += 1
-            time.sleep(sleep_time)
+            self.wake_up.clear()
 
-    def check_backend_health(self):
-        # endpoint health
-        try:
-            response = requests.get(f"{BACKEND_URL}/health", timeout=3)
-            if response.status_code == 200:
+    def _listen_events(self):
+        # czytamy Server-Sent Events: linie "event: ..." i "data: ..."
+        with self.session.get(
+            f"{BACKEND_URL}/todos/events", stream=True, timeout=(3, EVENTS_READ_TIMEOUT)
+        ) as response:
+            response.raise_for_status()
+            # jeśli cos wywalilo, a teraz jest połączenie
+            if not self.is_online:
                 self.is_online = True
-                # aktualizujemy status jak polaczylo
+                self.retry_count = 0  # resetujemy licznik prób
                 self.app_ref.update_connection_status("Connected ✓", ft.Colors.GREEN)
-            else:
-                raise Exception("Health check failed")
-        except:
-            self.is_online = False
-            # brak polaczenia i ile prób połaczenia
-            # to do można dodać więcej logiki np. zliczanie błędów
-            status = f"Backend offline (Retry {self.retry_count})" if self.retry_count > 0 else "Backend offline"
-            self.app_ref.update_connection_status(status, ft.Colors.RED)
+                self.app_ref.on_backend_reconnected()  # powiadamiamy appkę
+            event_type = None
+            for line in response.iter_lines(decode_unicode=True):
+                if not self.monitoring:
+                    return
+                if line.startswith("event:"):
+                    event_type = line[len("event:"):].strip()
+                elif line.startswith("data:") and event_type in ("changes", "resync"):
+                    self.app_ref.on_backend_event(event_type, json.loads(line[len("data:"):]))
 
     def manual_retry(self):
-        # ręczna próba połączenia np. kliknięcie przycisku "Retry"
+        # ręczna próba połączenia np. kliknięcie przycisku "Retry" - budzimy pętlę monitorowania
         # to do - można dodać logikę by nie spamować próbami np co 5 sekund?
-        # to do - niech wyświetla status ile razy próbowano się połączyć nadal mimo wciśnięcia retry
         self.retry_count = 0
         self.app_ref.update_connection_status("Connecting...", ft.Colors.ORANGE)
-        threading.Thread(target=self.check_backend_health, daemon=True).start()
+        self.wake_up.set()
+
+
+class RequestError(str):
+    # błąd z make_request - nadal zwykły tekst do wypisania, ale z kodem HTTP odpowiedzi
+    # (None = brak odpowiedzi: zerwane połączenie, timeout)
+
+    def __new__(cls, message, status=None):
+        error = super().__new__(cls, message)
+        error.status = status
+        return error
+
+    @property
+    def rejected(self) -> bool:
+        # 4xx - backend odrzucił samo żądanie, ponowienie da ten sam wynik (poza timeoutem
+        # i limitem zapytań, które mijają)
+        return self.status is not None and 400 <= self.status < 500 and self.status not in (408, 429)
 
 
 class ApiClient:
-    # API HTTP do backendu (GET, POST, PUT, DELETE)
+    # API HTTP do backendu (GET, POST, PUT, PATCH, DELETE) przez wspólną sesję z pulą połączeń
+
+    session = make_session()
+    # zapytania w tle idą przez stałą pulę wątków zamiast nowego wątku na każde kliknięcie
+    executor = ThreadPoolExecutor(max_workers=HTTP_WORKERS, thread_name_prefix="api")
+    metrics = RequestMetrics()
+
+    # ostatni ETag i odpowiedź dla URL-i z GET (LRU do ETAG_CACHE_SIZE) - na 304 oddajemy
+    # zapamiętane dane
+    _etag_cache = OrderedDict()
+    _etag_lock = threading.Lock()
+
+    @staticmethod
+    def submit(fn, *args):
+        # uruchamia fn w puli wątków; wyjątek wypisujemy, bo future nikt nie odbiera
+        ApiClient.metrics.task_queued()
+
+        def run():
+            ApiClient.metrics.task_started()
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+
+        return ApiClient.executor.submit(run)
 
     @staticmethod
     def make_request(method: str, url: str, json_data=None, timeout=5):
+        method = method.upper()
+        if method not in ("GET", "POST", "PUT", "PATCH", "DELETE"):
+            return None, "Unsupported method"
+        ApiClient.metrics.request_started()
+        error = None
         try:
-            if method.upper() == "GET":
-                response = requests.get(url, timeout=timeout)
-            elif method.upper() == "POST":
-                response = requests.post(url, json=json_data, timeout=timeout)
-            elif method.upper() == "PUT":
-                response = requests.put(url, json=json_data, timeout=timeout)
-            elif method.upper() == "DELETE":
-                response = requests.delete(url, timeout=timeout)
-            else:
-                return None, "Unsupported method"
+            headers = {}
+            cached = None
+            if method == "GET":
+                with ApiClient._etag_lock:
+                    cached = ApiClient._etag_cache.get(url)
+                    if cached:
+                        ApiClient._etag_cache.move_to_end(url)
+                headers["Accept"] = ACCEPT_HEADER
+                if cached:
+                    headers["If-None-Match"] = cached[0]
+            # DELETE /todos/batch przyjmuje listę id w body
+            response = ApiClient.session.request(method, url, json=json_data, headers=headers, timeout=timeout)
+            if response.status_code == 304 and cached:
+                return cached[1], None
             response.raise_for_status()
-            return response.json() if response.content else {}, None
+            data = ApiClient.decode_response(response)
+            if method == "GET" and response.headers.get("ETag"):
+                with ApiClient._etag_lock:
+                    ApiClient._etag_cache[url] = (response.headers["ETag"], data)
+                    ApiClient._etag_cache.move_to_end(url)
+                    while len(ApiClient._etag_cache) > ETAG_CACHE_SIZE:
+                        ApiClient._etag_cache.popitem(last=False)
+            return data, None
         except Exception as e:
-            return None, str(e)
+            response = getattr(e, "response", None)
+            error = RequestError(str(e), response.status_code if response is not None else None)
+            return None, error
+        finally:
+            ApiClient.metrics.request_finished(error)
+
+    @staticmethod
+    def decode_response(response):
+        content_type = response.headers.get("Content-Type", "")
+        if content_type.startswith(MSGPACK_MEDIA_TYPE):
+            data = msgpack.unpackb(response.content, timestamp=3)
+        elif content_type.startswith(COLUMNS_MEDIA_TYPE):
+            data = response.json()
+        else:
+            return response.json() if response.content else {}
+        # listy przychodzą jako kolumny - zamieniamy je z powrotem na słowniki jak w JSON
+        for key in ("items", "changed"):
+            if isinstance(data.get(key), dict):
+                data[key] = ApiClient.rows_from_columns(data[key])
+        return data
+
+    @staticmethod
+    def rows_from_columns(columns: dict) -> list:
+        for field, values in columns.items():
+            # znaczniki czasu z MessagePack na napisy ISO, tak jak w JSON z backendu
+            if values and isinstance(values[0], datetime):
+                columns[field] = [value.replace(tzinfo=None).isoformat() for value in values]
+        fields = list(columns)
+        return [dict(zip(fields, row)) for row in zip(*columns.values())]
+
+
+class LocalStore:
+    # lokalna kopia zadań i dziennik operacji (create/update/delete) w jednym pliku SQLite.
+    # Każda zmiana z UI najpierw trafia tutaj - do kopii i na koniec dziennika - a dopiero potem
+    # idzie do backendu, więc bez połączenia nic nie ginie. Zadanie utworzone offline nie ma
+    # jeszcze id, rozpoznajemy je po kluczu (key), który backend zapisuje przy tworzeniu.
+    # Dziennik wysyła jeden wątek na proces (send/replay), a wyniki dostają wszystkie otwarte sesje.
+
+    instance = None
+    instance_lock = threading.Lock()
+
+    @classmethod
+    def shared(cls):
+        with cls.instance_lock:
+            if cls.instance is None:
+                cls.instance = cls(LOCAL_STORE_PATH)
+            return cls.instance
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS todos (
+                id INTEGER UNIQUE,
+                key TEXT UNIQUE,
+                title TEXT NOT NULL,
+                completed INTEGER NOT NULL DEFAULT 0,
+                created_at TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_todos_created_at_id ON todos (created_at DESC, id DESC);
+            CREATE TABLE IF NOT EXISTS operations (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                body TEXT NOT NULL
+            );
+        """)
+        # ile operacji w dzienniku czeka na każde zadanie (po id albo kluczu) - zadania z takimi
+        # operacjami nie nadpisujemy stanem z backendu
+        self.unsent = Counter()
+        for (body,) in self.db.execute("SELECT body FROM operations"):
+            self.unsent[self.todo_ref(json.loads(body))] += 1
+        self.sending = False  # czy wątek wysyłający dziennik już działa
+        self.apps = weakref.WeakSet()  # otwarte sesje (TodoApp), które dostają wyniki operacji
+
+    @staticmethod
+    def todo_ref(operation):
+        if operation["id"] is not None:
+            return operation["id"]
+        return operation.get("ref") or operation["key"]
+
+    def has_unsent(self, task) -> bool:
+        with self.lock:
+            return bool(self.unsent[task.id] or (task.key and self.unsent[task.key]))
+
+    def load(self, completed, limit):
+        # pierwsza strona zakładki z lokalnej kopii, w tej samej kolejności co GET /todos
+        query = "SELECT id, key, title, completed, created_at FROM todos"
+        params = []
+        if completed:
+            query += " WHERE completed = ?"
+            params.append(completed == "true")
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.db.execute(query, params).fetchall()
+        return [{**dict(row), "completed": bool(row["completed"])} for row in rows]
+
+    def save_page(self, todos, completed, after=None, last=False):
+        # strona z backendu - zapisujemy ją i kasujemy z kopii zadania z jej zakresu
+        # (created_at, id), których backend już nie ma; zadań z niewysłanymi zmianami nie ruszamy
+        with self.lock:
+            todos = [todo for todo in todos if not self.unsent[todo["id"]]]
+            query = "DELETE FROM todos WHERE id IS NOT NULL"
+            params = []
+            if completed:
+                query += " AND completed = ?"
+                params.append(completed == "true")
+            if after:
+                query += " AND (created_at, id) < (?, ?)"
+                params += list(after)
+            if todos and not last:
+                query += " AND (created_at, id) >= (?, ?)"
+                params += [todos[-1]["created_at"], todos[-1]["id"]]
+            if todos or last:
+                kept = [todo["id"] for todo in todos] + [ref for ref in self.unsent if isinstance(ref, int)]
+                query += f" AND id NOT IN ({', '.join('?' * len(kept))})"
+                self.db.execute(query, params + kept)
+            self._upsert(todos)
+            self.db.commit()
+
+    def save_changes(self, changed, deleted):
+        with self.lock:
+            self._upsert([todo for todo in changed if not self.unsent[todo["id"]]])
+            self.db.executemany("DELETE FROM todos WHERE id = ?", [(todo_id,) for todo_id in deleted])
+            self.db.commit()
+
+    def _upsert(self, todos):
+        self.db.executemany(
+            "INSERT INTO todos (id, title, completed, created_at) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET title = excluded.title, completed = excluded.completed",
+            [(todo["id"], todo["title"], todo.get("completed", False), todo["created_at"]) for todo in todos],
+        )
+
+    def record(self, operation):
+        # operacja na koniec dziennika i od razu na lokalną kopię, w jednej transakcji
+        if operation["id"] is not None:
+            where, ref = "id = ?", operation["id"]
+        else:
+            where, ref = "key = ?", operation.get("ref") or operation["key"]
+        with self.lock:
+            self.db.execute("INSERT INTO operations (body) VALUES (?)", (json.dumps(operation),))
+            if operation["op"] == "create":
+                self.db.execute(
+                    "INSERT INTO todos (key, title, completed, created_at) VALUES (?, ?, 0, ?)",
+                    (operation["key"], operation["title"], datetime.utcnow().isoformat()),
+                )
+            elif operation["op"] == "update":
+                fields = {field: operation[field] for field in ("title", "completed") if field in operation}
+                assignments = ", ".join(f"{field} = ?" for field in fields)
+                self.db.execute(f"UPDATE todos SET {assignments} WHERE {where}", [*fields.values(), ref])
+            elif operation["op"] == "clear_completed":
+                self.db.execute("DELETE FROM todos WHERE completed = 1")
+            else:
+                self.db.execute(f"DELETE FROM todos WHERE {where}", (ref,))
+            self.db.commit()
+            self.unsent[self.todo_ref(operation)] += 1
+
+    def pending(self, limit):
+        # najstarsze operacje z dziennika: lista (seq, operacja)
+        with self.lock:
+            rows = self.db.execute("SELECT seq, body FROM operations ORDER BY seq LIMIT ?", (limit,)).fetchall()
+        return [(row["seq"], json.loads(row["body"])) for row in rows]
+
+    def acknowledge(self, batch, results):
+        # backend przyjął paczkę - zdejmujemy ją z dziennika, zadaniom utworzonym offline
+        # wpisujemy id nadane przez backend, a te, których backend już nie ma, kasujemy
+        with self.lock:
+            for (_, operation), result in zip(batch, results):
+                todo = result["todo"]
+                ref = self.todo_ref(operation)
+                if operation["op"] == "create" and todo:
+                    # to samo zadanie mogło już przyjść ze zdarzeniem, jako wiersz bez klucza
+                    self.db.execute("DELETE FROM todos WHERE id = ? AND key IS NOT ?", (todo["id"], operation["key"]))
+                    self.db.execute(
+                        "UPDATE todos SET id = ?, created_at = ? WHERE key = ?",
+                        (todo["id"], todo["created_at"], operation["key"]),
+                    )
+                elif result["status"] == "rejected":
+                    # operacja wyrzucona z dziennika - zadanie, które tworzyła, znika z kopii;
+                    # zmiany z update/delete cofnie stan z backendu (sesje pobiorą listę od nowa)
+                    if operation["op"] == "create":
+                        self.db.execute("DELETE FROM todos WHERE key = ?", (operation["key"],))
+                elif result["status"] == "missing" and operation["id"] is not None:
+                    self.db.execute("DELETE FROM todos WHERE id = ?", (operation["id"],))
+                elif result["status"] == "missing":
+                    # zadanie utworzone offline (create albo operacja z ref) - po jego kluczu
+                    self.db.execute("DELETE FROM todos WHERE key = ?", (ref,))
+                if self.unsent[ref] > 1:
+                    self.unsent[ref] -= 1
+                else:
+                    self.unsent.pop(ref, None)
+            self.db.executemany("DELETE FROM operations WHERE seq = ?", [(seq,) for seq, _ in batch])
+            self.db.commit()
+
+    def register(self, app):
+        self.apps.add(app)
+
+    def unregister(self, app):
+        self.apps.discard(app)
+
+    def send(self):
+        with self.lock:
+            if self.sending:
+                return  # wysyłający wątek sam weźmie nowe operacje z dziennika
+            self.sending = True
+        ApiClient.submit(self.replay)
+
+    def replay(self):
+        # dziennik paczkami, po kolei; ponowienie paczki po zgubionej odpowiedzi jest bezpieczne,
+        # bo backend rozpoznaje operacje po kluczach. Przy braku połączenia i 5xx dziennik zostaje
+        # i wysyłamy go po powrocie backendu (on_backend_reconnected którejś z sesji). Odrzuconej
+        # paczki (4xx) ponawianie nie naprawi, a blokowałaby wszystko za sobą - wysyłamy ją wtedy
+        # po jednej operacji i wyrzucamy z dziennika tylko te, które backend odrzuca
+        single_until = None  # seq ostatniej operacji odrzuconej paczki
+        while True:
+            batch = self.pending(1 if single_until is not None else OPERATIONS_BATCH_SIZE)
+            if not batch:
+                with self.lock:
+                    # między pending a tym miejscem ktoś mógł dopisać operację i zastać sending
+                    if not self.db.execute("SELECT 1 FROM operations LIMIT 1").fetchone():
+                        self.sending = False
+                        return
+                continue
+            results, error = ApiClient.make_request(
+                "POST", f"{BACKEND_URL}/todos/operations", {"items": [operation for _, operation in batch]}
+            )
+            if error and error.rejected and len(batch) > 1:
+                single_until = batch[-1][0]
+                continue
+            if error and error.rejected:
+                print(f"Operation rejected by backend, dropping it: {batch[0][1]} ({error})")
+                results = [{"key": batch[0][1]["key"], "status": "rejected", "todo": None}]
+            elif error:
+                print(f"Error sending operations to backend: {error}")
+                with self.lock:
+                    self.sending = False
+                return
+            if single_until is not None and batch[-1][0] >= single_until:
+                single_until = None
+            self.acknowledge(batch, results)
+            for app in list(self.apps):
+                app.apply_operation_results(batch, results)
+
+
+class TaskUpdates:
+    # zmiany jednego zadania z krótkiego okna łączymy w jedną operację update (tylko zmienione
+    # pola) i dopisujemy do dziennika operacji - do backendu wysyła je TodoApp.send_operations,
+    # po kolei, więc nic nie trzeba cofać, gdy backend akurat nie odpowiada.
+    # Dziennik zastąpił wcześniejsze numery wersji klienta i odrzucanie starych odpowiedzi
+    # w locie: kolejność daje sam dziennik (jedna paczka naraz, w kolejności zapisu), stan
+    # z backendu (lista, zdarzenia) ignorujemy, dopóki zadanie ma coś niewysłanego (busy),
+    # a powtórzone operacje backend rozpoznaje po kluczu i nie wykonuje drugi raz.
+
+    def __init__(self, task):
+        self.task = task
+        self.lock = threading.Lock()
+        self.pending = {}  # pola zmienione lokalnie, jeszcze nie w dzienniku
+
+    def change(self, **fields):
+        with self.lock:
+            self.pending.update(fields)
+        debouncer.schedule(self, UPDATE_DEBOUNCE_SECONDS, self.flush)
+
+    def busy(self) -> bool:
+        # czy mamy lokalne zmiany, których backend jeszcze nie potwierdził
+        with self.lock:
+            if self.pending:
+                return True
+        return self.task.app_ref.store.has_unsent(self.task)
+
+    def cancel(self):
+        # zadanie usunięte - niezapisane zmiany nie mają już sensu
+        debouncer.cancel(self)
+        with self.lock:
+            self.pending.clear()
+
+    def flush(self):
+        with self.lock:
+            data, self.pending = self.pending, {}
+        if data:
+            self.task.app_ref.record_operation("update", self.task, **data)
 
 
 class Task(ft.Column):
     # pojedyncze zadanie z checkboxem, edycją i usuwaniem
 
-    def __init__(self, task_name, task_status_change, task_delete, id=None, app_ref=None):
+    def __init__(self, task_name, task_status_change, task_delete, id=None, app_ref=None, key=None):
         super().__init__()
         self.id = id  # id zadania w bazie backendu
+        self.key = key  # klucz z lokalnego create - zadanie utworzone offline nie ma jeszcze id
         self.completed = False  # czy zadanie jest wykonane
         self.task_name = task_name
         self.task_status_change = task_status_change  # callback przy zmianie statusu
         self.task_delete = task_delete  # callback przy usuwaniu
         self.app_ref = app_ref  # referencja do aplikacji
+        self.updates = TaskUpdates(self)  # zmiany do wysłania do backendu
+        self.sort_key = None  # (created_at, id) z backendu - lista jest posortowana malejąco
 
         # widok zadania - checkbox z nazwą i przyciski edycji oraz usuwania
         self.display_task = ft.Checkbox(
@@ -159,56 +713,46 @@ class Task(ft.Column):
         new_title = self.edit_name.value.strip()
         if not new_title:
             return  # bez pustej nazwy
-        old_title = self.display_task.label
         self.display_task.label = new_title
         self.display_view.visible = True
         self.edit_view.visible = False
         self.update()
 
-        # jeśli zadanie ma id to aktualizujemy
-        if self.id is not None:
-            def update_backend():
-                data, error = ApiClient.make_request(
-                    "PUT", f"{BACKEND_URL}/todos/{self.id}",
-                    {"title": new_title, "completed": self.completed}
-                )
-                #  jak wywala błąd to cofamy 
-                if error:
-                    self.display_task.label = old_title
-                    self.update()
-
-            threading.Thread(target=update_backend, daemon=True).start()
+        # zmiana idzie do dziennika z opóźnieniem, razem z innymi zmianami tego zadania
+        self.updates.change(title=new_title)
 
     def status_changed(self, e):
         # zmiana checkboxa - zmieniamy completed i do backendu
-        old_completed = self.completed
         self.completed = self.display_task.value
-
-        if self.id is not None:
-            def update_status():
-                data, error = ApiClient.make_request(
-                    "PUT", f"{BACKEND_URL}/todos/{self.id}",
-                    {"title": self.display_task.label, "completed": self.completed}
-                )
-                # jeśli błąd cofamy as always
-                
-                if error:
-                    self.completed = old_completed
-                    self.display_task.value = old_completed
-                    self.update()
-
-            threading.Thread(target=update_status, daemon=True).start()
-
+        self.updates.change(completed=self.completed)
         self.task_status_change(self)  # callback do odswieżenia UI
 
+    def apply_todo(self, todo):
+        # stan z backendu (albo lokalnej kopii); zadanie z niewysłanymi zmianami zostawiamy -
+        # nasze operacje i tak nadpiszą backend (last write wins), a dane mogą dotyczyć naszego
+        # wcześniejszego zapisu. Przypisujemy tylko pola, które się zmieniły, żeby update()
+        # nie wysyłał nic zbędnego; zwraca, czy coś się zmieniło.
+        if todo["id"] is not None:
+            self.sort_key = (todo["created_at"], todo["id"])
+        if self.updates.busy():
+            return False
+        fields = {"title": todo["title"], "completed": todo.get("completed", False)}
+        changed = False
+        if self.display_task.label != fields["title"]:
+            self.display_task.label = fields["title"]
+            changed = True
+        if self.completed != fields["completed"]:
+            self.completed = fields["completed"]
+            self.display_task.value = self.completed
+            self.app_ref.show_by_filter(self)
+            changed = True
+        return changed
+
     def delete_clicked(self, e):
-        # kliknięcie usuń - usuwamy z UI i z  backendu jeśli mamy id taska
+        # kliknięcie usuń - usuwamy z UI i przez dziennik z backendu
+        self.updates.cancel()
         self.task_delete(self)
-        if self.id is not None:
-            def delete_backend():
-                ApiClient.make_request("DELETE", f"{BACKEND_URL}/todos/{self.id}")
-
-            threading.Thread(target=delete_backend, daemon=True).start()
+        self.app_ref.record_operation("delete", self)
 
 
 class TodoApp(ft.Column):
@@ -220,6 +764,27 @@ class TodoApp(ft.Column):
 
         # monitorujemy backend czy jest online/offline
         self.backend_monitor = BackendMonitor(self)
+        # lokalna kopia zadań i dziennik operacji, wspólne dla wszystkich sesji w procesie
+        self.store = LocalStore.shared()
+        self.store.register(self)
+        # listę zadań (tasks.controls) i licznik aktywnych zmieniają wątek UI, monitor zdarzeń,
+        # wątek dziennika i pula zapytań - każda zmiana i przebudowa listy idzie pod tą blokadą
+        # (RLock, bo np. apply_changes woła count_active)
+        self.tasks_lock = threading.RLock()
+        # odświeżenia UI z wątków w tle idą przez scheduler, nie przez update()
+        self.ui = UpdateScheduler(page, self.tasks_lock)
+        # licznik aktywnych - ze statystyk backendu, potem poprawiany o nasze i cudze zmiany
+        # (None = jeszcze nie wiemy); id usuniętych przez nas, żeby zdarzenie nie liczyło ich drugi raz
+        self.active_count = None
+        self.deleted_ids = set()
+
+        # kursor do GET /todos/changes - None dopóki nie załadujemy pełnej listy
+        self.changes_cursor = None
+        # numer ostatniego ładowania listy - starsze ładowania (np. po szybkim przełączaniu zakładek) przerywamy
+        self.load_generation = 0
+        # kursor następnej strony GET /todos (None = mamy wszystko) i czy właśnie jej szukamy
+        self.next_cursor = None
+        self.loading_page = False
 
         # wyświetlamy status połączenia
         self.connection_status = ft.Text(
@@ -246,14 +811,23 @@ class TodoApp(ft.Column):
             focused_border_color=ft.Colors.BLUE_400,
         )
 
+        # wyszukiwarka po tytule - zapytanie idzie do backendu z opóźnieniem (debounce)
+        self.search = ft.TextField(
+            hint_text="Search...",
+            prefix_icon=ft.Icons.SEARCH,
+            on_change=self.search_changed,
+            dense=True,
+        )
+
         # dodaj zadanie ( enter również działa, )
         self.add_button = ft.FloatingActionButton(
             icon=ft.Icons.ADD,
             on_click=self.add_clicked,
         )
 
-        # miejsce na listę zadań
-        self.tasks = ft.Column()
+        # lista zadań - ListView buduje tylko widoczne wiersze, a przewinięcie pod koniec
+        # dociąga następną stronę
+        self.tasks = ft.ListView(expand=True, on_scroll=self.tasks_scrolled, on_scroll_interval=100)
 
         # zakładki wg statusu filtr
         self.filter = ft.Tabs(
@@ -271,6 +845,7 @@ class TodoApp(ft.Column):
         self.items_left = ft.Text("0 items left")
 
         self.width = 600
+        self.expand = True
 
         # dodajemy elementy do głównego layoutu
         self.controls = [
@@ -299,9 +874,13 @@ class TodoApp(ft.Column):
                 ],
             ),
 
+            # wyszukiwanie
+            self.search,
+
             # zakładki z listą i przyciskiem kasowania wykonanych tasków
             ft.Column(
                 spacing=25,
+                expand=True,
                 controls=[
                     self.filter,
                     self.tasks,
@@ -320,7 +899,9 @@ class TodoApp(ft.Column):
             ),
         ]
 
-        # startujemy monitorowanie backendu i ładujemy listę zadań
+        # najpierw lista z lokalnej kopii (od razu, bez sieci), potem monitorowanie backendu,
+        # wysłanie zaległych operacji i świeża lista z backendu
+        self.reconcile_tasks(self.store.load(self.completed_filter(), TODOS_PAGE_SIZE))
         self.backend_monitor.start_monitoring()
         self.load_todos_from_backend()
 
@@ -329,44 +910,326 @@ class TodoApp(ft.Column):
         self.backend_monitor.manual_retry()
 
     def on_backend_reconnected(self):
-        # gdy backend teraz jest online, to ładujemy zadania
-        self.load_todos_from_backend()
+        # gdy backend teraz jest online, to wysyłamy operacje zebrane offline i dociągamy
+        # tylko zmiany (albo całość jak nie mamy kursora)
+        self.send_operations()
+        if self.changes_cursor:
+            self.sync_changes_from_backend()
+        else:
+            self.load_todos_from_backend()
+
+    def on_backend_event(self, event_type, data):
+        # zdarzenie ze strumienia - nakładamy zmiany na pojedyncze zadania
+        if event_type == "resync":
+            # za dużo zmian naraz albo nie nadążyliśmy - dociągamy je przez /todos/changes
+            self.on_backend_reconnected()
+            return
+        self.apply_changes(data)
 
     def update_connection_status(self, status: str, color):
-        # aktualizuj tekst i kolor statusu połączenia
+        # aktualizuj tekst i kolor statusu połączenia - tylko jak coś się zmieniło
+        if self.connection_status.value == status and self.connection_status.color == color:
+            return
         self.connection_status.value = status
         self.connection_status.color = color
         # pokaż przycisk retry tylko jak backend offline 
         self.retry_button.visible = color == ft.Colors.RED
-        if self.page:
-            self.page.update()
+        self.ui.mark(self.connection_status, self.retry_button)
+
+    def task_from_todo(self, todo):
+        # tworzy kontrolkę Task z obiektu todo z backendu
+        task = Task(
+            todo["title"],
+            self.task_status_change,
+            self.task_delete,
+            id=todo["id"],
+            app_ref=self,
+            key=todo.get("key"),
+        )
+        task.apply_todo(todo)
+        self.show_by_filter(task)
+        return task
+
+    def show_by_filter(self, task):
+        # backend zwraca już tylko zadania z zakładki, ale zadanie może zmienić status po załadowaniu
+        completed = self.completed_filter()
+        task.visible = completed is None or task.completed == (completed == "true")
+
+    def record_operation(self, op, task, **fields):
+        # zmiana z UI: do lokalnego dziennika, a potem (jak backend jest) od razu w drogę
+        operation = {"key": uuid.uuid4().hex, "op": op, "id": task.id, **fields}
+        if op == "delete" and task.id is not None:
+            self.deleted_ids.add(task.id)
+        if op == "create":
+            operation["key"] = task.key
+        elif task.id is None:
+            operation["ref"] = task.key
+        self.store.record(operation)
+        self.send_operations()
+
+    def send_operations(self):
+        self.store.send()
+
+    def close(self):
+        # sesja przeglądarki zamknięta - przestajemy słuchać backendu i dostawać wyniki operacji;
+        # to, co zostało w dzienniku, wyśle wspólny wątek
+        self.store.unregister(self)
+        self.backend_monitor.stop_monitoring()
+
+    def apply_operation_results(self, batch, results):
+        # id dla zadań utworzonych offline i stan po zapisie; zadania usunięte gdzie indziej znikają
+        with self.tasks_lock:
+            tasks_by_key = {task.key: task for task in self.tasks.controls if task.key}
+            tasks_by_id = {task.id: task for task in self.tasks.controls if task.id is not None}
+            gone, changed, reload = set(), [], False
+            for (_, operation), result in zip(batch, results):
+                # odrzucona zmiana mogła zostać już pokazana - bierzemy stan z backendu
+                reload = reload or (result["status"] == "rejected" and operation["op"] != "create")
+                task = tasks_by_id.get(operation["id"]) or tasks_by_key.get(operation.get("ref") or operation["key"])
+                if not task:
+                    continue
+                todo = result["todo"]
+                if result["status"] == "rejected":
+                    if operation["op"] == "create":
+                        gone.add(task)
+                elif result["status"] == "missing":
+                    gone.add(task)
+                elif todo:
+                    if task.id is None:
+                        task.id = todo["id"]
+                        # to samo zadanie mogło już przyjść ze zdarzeniem jako osobna pozycja
+                        duplicate = tasks_by_id.get(task.id)
+                        if duplicate:
+                            gone.add(duplicate)
+                        tasks_by_id[task.id] = task
+                    if task.apply_todo(todo):
+                        changed.append(task)
+            if gone:
+                self.tasks.controls[:] = [task for task in self.tasks.controls if task not in gone]
+                self.ui.mark(self.tasks)
+            elif changed:
+                self.ui.mark(*changed)
+        if reload:
+            self.load_todos_from_backend()
+
+    def completed_filter(self):
+        # parametr completed dla GET /todos wg wybranej zakładki (None = wszystkie)
+        status = self.filter.tabs[self.filter.selected_index].text.lower()
+        if status == "active to-dos":
+            return "false"
+        if status == "completed to-dos":
+            return "true"
+        return None
+
+    def refresh_items_left(self):
+        # licznik aktywnych bierzemy z backendu, bo lokalnie mamy tylko zadania z bieżącej zakładki;
+        # potem już tylko go poprawiamy (count_active), a tu wracamy, gdy zmiany nie da się policzyć
+
+        def refresh_async():
+            data, error = ApiClient.make_request("GET", f"{BACKEND_URL}/todos/stats/summary")
+            if not error:
+                with self.tasks_lock:
+                    self.active_count = data["active"]
+                    self.show_items_left()
+
+        ApiClient.submit(refresh_async)
+
+    def schedule_items_left(self):
+        # kilka niepewnych zdarzeń pod rząd = jedno zapytanie o statystyki
+        debouncer.schedule("stats", STATS_REFRESH_SECONDS, self.refresh_items_left)
+
+    def count_active(self, delta):
+        with self.tasks_lock:
+            if self.active_count is None or not delta:
+                return
+            self.active_count += delta
+            self.show_items_left()
+
+    def show_items_left(self):
+        value = f"{self.active_count} active item(s) left"
+        if self.items_left.value != value:
+            self.items_left.value = value
+            self.ui.mark(self.items_left)
+
+    def todos_url(self, after=None):
+        url = f"{BACKEND_URL}/todos?limit={TODOS_PAGE_SIZE}"
+        completed = self.completed_filter()
+        if completed:
+            url += f"&completed={completed}"
+        if after:
+            url += f"&after={after}"
+        return url
 
     def load_todos_from_backend(self):
-        # ładowanie zadań z backendu asynchronicznie
+        # ładujemy asynchronicznie tylko pierwszą stronę zadań z wybranej zakładki,
+        # resztę dociąga przewijanie (load_next_page)
+        with self.tasks_lock:
+            self.load_generation += 1
+            generation = self.load_generation
+        completed = self.completed_filter()
+        url = self.todos_url()
 
         def load_async():
-            data, error = ApiClient.make_request("GET", f"{BACKEND_URL}/todos")
-            # jeśli pomyślnie pobraliśmy dane to czyścimy listę i ładujemy od nowa
+            # kursor zmian bierzemy przed listą - zmiany w trakcie ładowania dojdą przy synchronizacji
+            head, error = ApiClient.make_request("GET", f"{BACKEND_URL}/todos/changes")
             if not error:
-                self.tasks.controls.clear()
-                for todo in data:
-                    task = Task(
-                        todo["title"],
-                        self.task_status_change,
-                        self.task_delete,
-                        id=todo["id"],
-                        app_ref=self
-                    )
-                    task.completed = todo.get("completed", False)
-                    task.display_task.value = task.completed
-                    self.tasks.controls.append(task)
-                if self.page:
-                    self.update()
-            else:
+                data, error = ApiClient.make_request("GET", url)
+            if error:
                 # jeśli błąd to nie czyścimy listy, tylko wypisujemy błąd do konsoli
                 print(f"Error loading todos from backend: {error}")
-
-        threading.Thread(target=load_async, daemon=True).start()
+                return
+            with self.tasks_lock:
+                # w międzyczasie ruszyło nowsze ładowanie (inna zakładka) - to porzucamy
+                if generation != self.load_generation:
+                    return
+                self.reconcile_tasks(data["items"])
+                self.next_cursor = data.get("next_cursor")
+                self.changes_cursor = head["cursor"]
+            self.store.save_page(data["items"], completed, last=not data.get("next_cursor"))
+            self.ui.mark(self.tasks)
+            self.refresh_items_left()
+
+        ApiClient.submit(load_async)
+
+    def tasks_scrolled(self, e):
+        if e.max_scroll_extent - e.pixels < LOAD_MORE_THRESHOLD:
+            self.load_next_page()
+
+    def load_next_page(self):
+        if not self.next_cursor or self.loading_page:
+            return
+        self.loading_page = True
+        generation = self.load_generation
+        completed = self.completed_filter()
+        url = self.todos_url(self.next_cursor)
+        # pozycja ostatniego załadowanego zadania - od niej zaczyna się ta strona
+        with self.tasks_lock:
+            after = next((task.sort_key for task in reversed(self.tasks.controls) if task.sort_key), None)
+
+        def load_page_async():
+            try:
+                data, error = ApiClient.make_request("GET", url)
+                if error:
+                    print(f"Error loading todos from backend: {error}")
+                    return
+                with self.tasks_lock:
+                    if generation != self.load_generation:
+                        return
+                    # zadania, które już są (np. dodane przez zdarzenie), tylko poprawiamy
+                    tasks_by_id = {task.id: task for task in self.tasks.controls if task.id is not None}
+                    for todo in data["items"]:
+                        task = tasks_by_id.get(todo["id"])
+                        if task:
+                            task.apply_todo(todo)
+                        else:
+                            self.tasks.controls.append(self.task_from_todo(todo))
+                    self.next_cursor = data.get("next_cursor")
+                self.store.save_page(data["items"], completed, after=after, last=not data.get("next_cursor"))
+                self.ui.mark(self.tasks)
+            finally:
+                self.loading_page = False
+
+        ApiClient.submit(load_page_async)
+
+    def reconcile_tasks(self, todos):
+        # zamiast budować listę od nowa: zadania o tych samych id zostają (poprawiamy tylko
+        # zmienione pola), nowe tworzymy, a brakujące wypadają - Flet wysyła wtedy tylko różnice
+        with self.tasks_lock:
+            tasks_by_id = {task.id: task for task in self.tasks.controls if task.id is not None}
+            controls = []
+            for todo in todos:
+                task = tasks_by_id.get(todo["id"])
+                if task:
+                    task.apply_todo(todo)
+                else:
+                    task = self.task_from_todo(todo)
+                controls.append(task)
+            # dodane lokalnie, na które backend jeszcze nie odpowiedział, zostają na końcu
+            controls += [task for task in self.tasks.controls if task.id is None]
+            if controls != self.tasks.controls:
+                self.tasks.controls[:] = controls
+
+    def sync_changes_from_backend(self):
+        # pobieramy tylko to co się zmieniło od ostatniego kursora i nakładamy na listę
+
+        def sync_async():
+            while True:
+                data, error = ApiClient.make_request(
+                    "GET", f"{BACKEND_URL}/todos/changes?since={self.changes_cursor}"
+                )
+                if error:
+                    # np. nieprawidłowy kursor - wtedy ładujemy wszystko od nowa
+                    print(f"Error syncing todos from backend: {error}")
+                    self.changes_cursor = None
+                    self.load_todos_from_backend()
+                    return
+                self.apply_changes(data)
+                self.changes_cursor = data["cursor"]
+                if not data["has_more"]:
+                    break
+
+        ApiClient.submit(sync_async)
+
+    def apply_changes(self, data):
+        # zmienione zadania aktualizujemy w miejscu, nowe wstawiamy na ich miejsce w kolejności
+        # (created_at, id) malejąco, usunięte wyrzucamy. Licznik aktywnych poprawiamy o różnicę
+        # dla zadań, które mamy; dla reszty (np. z innej zakładki) nie wiadomo, co się zmieniło,
+        # więc wtedy pytamy backend o statystyki
+        with self.tasks_lock:
+            tasks_by_id = {task.id: task for task in self.tasks.controls if task.id is not None}
+            pending_by_key = {task.key: task for task in self.tasks.controls if task.id is None and task.key}
+            delta, unknown, moved, changed = 0, False, False, []
+            for todo in data["changed"]:
+                task = tasks_by_id.get(todo["id"])
+                if not task:
+                    # nasze własne dodane zadanie może przyjść zanim backend potwierdzi operację create -
+                    # rozpoznajemy je po kluczu, z którym je utworzyliśmy
+                    task = pending_by_key.pop(todo.get("client_key"), None)
+                    if task:
+                        task.id = todo["id"]
+                        tasks_by_id[task.id] = task
+                if task:
+                    was_completed = task.completed
+                    if task.apply_todo(todo):
+                        changed.append(task)
+                    delta += was_completed - task.completed
+                else:
+                    task = self.task_from_todo(todo)
+                    moved = self.insert_task(task) or moved
+                    tasks_by_id[task.id] = task
+                    unknown = True
+            deleted = set(data["deleted"])
+            if deleted:
+                removed = [task for task in self.tasks.controls if task.id in deleted]
+                if removed:
+                    self.tasks.controls[:] = [task for task in self.tasks.controls if task.id not in deleted]
+                    delta -= sum(not task.completed for task in removed)
+                    moved = True
+                # nasze własne usunięcia są już policzone (task_delete)
+                unknown = unknown or bool(deleted - {task.id for task in removed} - self.deleted_ids)
+                self.deleted_ids -= deleted
+            self.store.save_changes(data["changed"], deleted)
+
+            if unknown:
+                self.schedule_items_left()
+            else:
+                self.count_active(delta)
+            if moved:
+                self.ui.mark(self.tasks)
+            elif changed:
+                self.ui.mark(*changed)
+
+    def insert_task(self, task) -> bool:
+        controls = self.tasks.controls
+        index = next(
+            (i for i, other in enumerate(controls) if other.sort_key is None or other.sort_key < task.sort_key),
+            len(controls),
+        )
+        # za ostatnim załadowanym wierszem - to zadanie przyjdzie z którąś z kolejnych stron
+        if index == len(controls) and self.next_cursor:
+            return False
+        controls.insert(index, task)
+        return True
 
     def add_clicked(self, e):
         # dodawanie nowego zadania
@@ -376,95 +1239,101 @@ class TodoApp(ft.Column):
 
         new_title = self.new_task.value.strip()
 
-        # dodajemy tymczasowe zadanie od razu do listy UI
-        temp_task = Task(
+        # zadanie od razu do listy UI, a do backendu przez dziennik - bez połączenia
+        # czeka tam na powrót backendu, id dostanie wtedy
+        task = Task(
             new_title,
             self.task_status_change,
             self.task_delete,
             id=None,
-            app_ref=self
+            app_ref=self,
+            key=uuid.uuid4().hex,
         )
-        temp_task.completed = False
-        temp_task.display_task.value = False
-        self.tasks.controls.append(temp_task)
+        self.show_by_filter(task)
+        with self.tasks_lock:
+            self.tasks.controls.append(task)
+            self.count_active(1)
 
         self.new_task.value = ""  # czyścimy pole
         self.new_task.focus()    # ustawiamy fokus
-        self.update()
-
-        # równolegle wysyłamy dodanie do backendu, jak się wszystko powiedzie to
-        # przypisujemy id zwrócone przez backend, a jak fail to usuwamy zadanie
-        def add_async():
-            data, error = ApiClient.make_request(
-                "POST", f"{BACKEND_URL}/todos",
-                {"title": new_title}
-            )
-            if not error:
-                temp_task.id = data["id"]
-                temp_task.completed = data.get("completed", False)
-                temp_task.display_task.value = temp_task.completed
-                self.update()
-            else:
-                if temp_task in self.tasks.controls:
-                    self.tasks.controls.remove(temp_task)
-                self.update()
+        self.ui.mark(self.tasks, self.new_task)
 
-        threading.Thread(target=add_async, daemon=True).start()
+        self.record_operation("create", task, title=new_title)
 
     def task_status_change(self, task):
         # callback gdy zmieniamy checkbox zrobione/nie
-        self.update()
+        self.count_active(-1 if task.completed else 1)
+        self.show_by_filter(task)
+        self.ui.mark(task)
 
     def task_delete(self, task):
         # usuwanie zadania z UI i aktualizacja widoku
-        if task in self.tasks.controls:
-            self.tasks.controls.remove(task)
-        self.update()
+        with self.tasks_lock:
+            if task in self.tasks.controls:
+                self.tasks.controls.remove(task)
+                if not task.completed:
+                    self.count_active(-1)
+        self.ui.mark(self.tasks)
 
     def tabs_changed(self, e):
-        # zmiana zakładek (filtr widoku) - odświeżamy widok
-        self.update()
+        # zmiana zakładek (filtr widoku) - od razu filtrujemy to co mamy i dociągamy z backendu tylko tę zakładkę
+        with self.tasks_lock:
+            for task in self.tasks.controls:
+                self.show_by_filter(task)
+        self.ui.mark(self.tasks)
+        if not (self.search.value or "").strip():
+            self.load_todos_from_backend()
+
+    def search_changed(self, e):
+        # każde naciśnięcie klawisza przesuwa wyszukiwanie - do backendu idzie tylko ostatnie
+        debouncer.schedule("search", SEARCH_DEBOUNCE_SECONDS, lambda: ApiClient.submit(self.run_search))
+
+    def run_search(self):
+        # wołane z puli wątków po debounce; pusty tekst = wracamy do zwykłej listy
+        query = (self.search.value or "").strip()
+        if not query:
+            self.load_todos_from_backend()
+            return
+        with self.tasks_lock:
+            self.load_generation += 1
+            generation = self.load_generation
+        data, error = ApiClient.make_request("GET", f"{BACKEND_URL}/todos/search?q={quote(query)}")
+        if error:
+            print(f"Error searching todos: {error}")
+            return
+        with self.tasks_lock:
+            # w międzyczasie poszło nowsze wyszukiwanie albo ładowanie listy
+            if generation != self.load_generation:
+                return
+            self.reconcile_tasks(data)
+            self.next_cursor = None
+        self.ui.mark(self.tasks)
 
     def clear_clicked(self, e):
-        # usuwanie wszystkich zadań wykonanych
-
-        completed_tasks = [task for task in self.tasks.controls if task.completed]
-        for task in completed_tasks:
-            self.task_delete(task)
-
-        def clear_async():
-            # równolegle usuwamy z backendu zadania wykonane
-            for task in completed_tasks:
-                if task.id is not None:
-                    ApiClient.make_request("DELETE", f"{BACKEND_URL}/todos/{task.id}")
-
-        threading.Thread(target=clear_async, daemon=True).start()
-
-    def before_update(self):
-        # przed każdą aktualizacją UI ukrywamy lub pokazujemy zadania wg filtra
-        # również liczmy ile jest aktywnych zadań i pokazujemy na dole
-
-        status = self.filter.tabs[self.filter.selected_index].text.lower()
-        count = 0
-        for task in self.tasks.controls:
-            if status == "active to-dos":
-                task.visible = not task.completed
-            elif status == "all to-dos":
-                task.visible = True
-            elif status == "completed to-dos":
-                task.visible = task.completed
-            if not task.completed:
-                count += 1
-        self.items_left.value = f"{count} active item(s) left"
+        # usuwanie wszystkich zadań wykonanych - jedna operacja clear_completed w dzienniku:
+        # backend usuwa wszystkie wykonane (także niezaładowane w tej zakładce) jednym DELETE,
+        # ale dopiero po zmianach zapisanych wcześniej, więc online i offline wynik jest ten sam.
+        # Czekające w debounce zmiany (np. właśnie odznaczone zadanie) idą do dziennika przed nią
+        with self.tasks_lock:
+            tasks = list(self.tasks.controls)
+        for task in tasks:
+            debouncer.cancel(task.updates)
+            task.updates.flush()
+        with self.tasks_lock:
+            for task in [task for task in self.tasks.controls if task.completed]:
+                self.task_delete(task)
+        self.store.record({"key": uuid.uuid4().hex, "op": "clear_completed", "id": None})
+        self.send_operations()
 
 
 def main(page: ft.Page):
     # ustawienia okna i motywu
     page.title = "ToDo!"
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
-    page.scroll = ft.ScrollMode.ADAPTIVE
     page.theme_mode = ft.ThemeMode.DARK
-    page.add(TodoApp(page))
+    app = TodoApp(page)
+    page.on_close = lambda e: app.close()
+    page.add(app)
     
 
 